@@ -0,0 +1,76 @@
+"""
+Closed loop HTTP load generator.
+
+Runs ``--concurrency`` clients, each sending requests back to back to
+``--url`` for ``--duration`` seconds, and reports requests per second and
+latency percentiles. Run it once against the WSGI deployment and once
+against the ASGI one to compare them, e.g.
+
+    python benchmarks/http_load.py --url http://localhost:8000/post/1/ \\
+        --token $ACCESS --method GET
+"""
+
+import argparse
+import statistics
+import threading
+import time
+
+import requests
+
+
+def client(args, deadline, latencies, errors):
+    session = requests.Session()
+    if args.token:
+        session.headers["Authorization"] = f"Bearer {args.token}"
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        try:
+            response = session.request(args.method, args.url, timeout=10)
+            ok = response.status_code < 500
+        except requests.RequestException:
+            ok = False
+        latencies.append(time.perf_counter() - start)
+        if not ok:
+            errors.append(1)
+
+
+def percentile(values, q):
+    return values[min(int(len(values) * q), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", required=True)
+    parser.add_argument("--token", help="access token to authenticate with")
+    parser.add_argument("--method", default="GET")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0)
+    args = parser.parse_args()
+
+    latencies, errors = [], []
+    deadline = time.monotonic() + args.duration
+    threads = [
+        threading.Thread(
+            target=client, args=(args, deadline, latencies, errors)
+        )
+        for _ in range(args.concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+    if not latencies:
+        raise SystemExit("no requests were sent")
+    print(f"requests: {len(latencies)} ({len(errors)} errors)")
+    print(f"rps:      {len(latencies) / elapsed:.1f}")
+    print(f"mean:     {statistics.mean(latencies) * 1000:.1f}ms")
+    print(f"p50:      {percentile(latencies, 0.50) * 1000:.1f}ms")
+    print(f"p99:      {percentile(latencies, 0.99) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
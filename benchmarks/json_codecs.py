@@ -0,0 +1,125 @@
+"""
+Compare the orjson renderer and parser with DRF's JSON ones.
+
+Times rendering and parsing of payloads shaped like the post and user
+detail responses, and checks that both renderers agree byte for byte.
+Run with the app's requirements installed:
+
+    python benchmarks/json_codecs.py
+"""
+
+import argparse
+import io
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta, timezone
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "friendly"))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "friendly.settings")
+os.environ.setdefault("SECRET_KEY", "benchmark")
+
+import django  # noqa: E402
+
+django.setup()
+
+from api.parsers import ORJSONParser  # noqa: E402
+from api.renderers import ORJSONRenderer  # noqa: E402
+from rest_framework.parsers import JSONParser  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+NOW = datetime(2021, 8, 20, 9, 15, 42, 123456, tzinfo=timezone.utc)
+
+
+def post_detail():
+    return {
+        "id": 1,
+        "content": "Once upon a tyne, there lived a great old fellow 😶 " * 5,
+        "author": "http://localhost:8000/user/1/",
+        "created_when": NOW,
+        "like_count": 1000,
+        "likes": {
+            "next": "http://localhost:8000/post/1/likes/?cursor=cD0yMDIx",
+            "previous": None,
+            "results": [
+                {"user": i, "created_when": NOW - timedelta(minutes=i)}
+                for i in range(20)
+            ],
+        },
+    }
+
+
+def user_detail():
+    return {
+        "id": 1,
+        "username": "@gm",
+        "email": "gm@example.com",
+        "created_when": NOW,
+        "geo_data": {
+            "ip": "102.89.2.1",
+            "city": "Nairobi",
+            "country": "Kenya",
+            "country_code": "KE",
+            "latitude": 36.8155,
+            "longitude": -1.2841,
+            "timezone": {"name": "Africa/Nairobi", "gmt_offset": 3},
+            "currency": {"code": "KES", "name": "Kenyan Shilling"},
+        },
+        "posts": "http://localhost:8000/user/1/posts/",
+        "post_count": 42,
+        "created_on_holiday": [
+            {
+                "name": "Madaraka Day",
+                "date": "2021-06-01",
+                "type": "National",
+                "week_day": "Tuesday",
+            }
+        ],
+    }
+
+
+def bench(label, func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=5))
+    print(f"{label:<32}{seconds / number * 1e6:>10.2f}us")
+    return seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=10000)
+    args = parser.parse_args()
+
+    for name, data in (
+        ("post detail", post_detail()),
+        ("user", user_detail()),
+    ):
+        body = JSONRenderer().render(data)
+        assert ORJSONRenderer().render(data) == body, name
+        print(f"{name} ({len(body)} bytes)")
+        before = bench(
+            "  render JSONRenderer",
+            lambda: JSONRenderer().render(data),
+            args.number,
+        )
+        after = bench(
+            "  render ORJSONRenderer",
+            lambda: ORJSONRenderer().render(data),
+            args.number,
+        )
+        print(f"  {'render speedup':<30}{before / after:>10.1f}x")
+        before = bench(
+            "  parse JSONParser",
+            lambda: JSONParser().parse(io.BytesIO(body)),
+            args.number,
+        )
+        after = bench(
+            "  parse ORJSONParser",
+            lambda: ORJSONParser().parse(io.BytesIO(body)),
+            args.number,
+        )
+        print(f"  {'parse speedup':<30}{before / after:>10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -11,4 +11,11 @@ then
     echo "PostgreSQL started"
 fi
 
+if [ -n "$PROMETHEUS_MULTIPROC_DIR" ]
+then
+    # metrics of the processes of a previous run must not be added up
+    rm -rf "$PROMETHEUS_MULTIPROC_DIR"
+    mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+fi
+
 exec "$@"
@@ -0,0 +1,30 @@
+from api.cache import auth_user_cache
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that keeps authenticated users in a per-process
+    cache instead of querying for the user on every request.
+
+    Saving or deleting a user, one by one or through a queryset, invalidates
+    it in every process, so a deactivated user is refused as soon as the
+    change is committed.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            )
+
+        user = auth_user_cache.get(user_id)
+        if user is None:
+            user = super().get_user(validated_token)
+            auth_user_cache.set(user_id, user)
+        return user
@@ -0,0 +1,297 @@
+import copy
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import redis
+from api.utils import get_redis
+from django.conf import settings
+from django.db import transaction
+from prometheus_client import Counter
+
+logger = logging.getLogger(__name__)
+
+CACHE_LOOKUPS = Counter(
+    "friendly_detail_cache_lookups_total",
+    "Detail cache lookups by outcome",
+    ["name", "result"],
+)
+
+
+class DetailCache(object):
+    """
+    Read-through cache of serialized detail payloads kept in Redis.
+
+    Keys carry ``DETAIL_CACHE_VERSION`` so that a deploy which changes the
+    shape of a payload never reads entries written by the previous one,
+    and the origin of the request, as payloads hold absolute links. Each
+    object also has a generation, bumped when it is invalidated: entries
+    of an older generation, of any origin, are not read, and an entry is
+    only written if the generation did not change while it was built, so
+    that an invalidation racing a rebuild is never lost.
+
+    Entries stay fresh for ``DETAIL_CACHE_TIMEOUT`` seconds and are then
+    kept for another ``DETAIL_CACHE_STALE_TIMEOUT`` seconds. Rebuilding an
+    entry takes a short Redis lock so that only one worker per key hits the
+    database: while it rebuilds, the others are served the stale copy, or,
+    if there is none, wait briefly for the rebuilt one. Redis being
+    unavailable degrades to reading from the database.
+    """
+
+    def __init__(self, name):
+        self.name = name
+
+    def key(self, pk, origin=""):
+        version = settings.DETAIL_CACHE_VERSION
+        return f"detail:v{version}:{self.name}:{pk}:{origin}"
+
+    def generation_key(self, pk):
+        version = settings.DETAIL_CACHE_VERSION
+        return f"gen:detail:v{version}:{self.name}:{pk}"
+
+    def get_or_set(self, pk, build, origin=""):
+        """
+        :param origin: scheme and host the payload's links are built with
+        """
+
+        key, generation_key = self.key(pk, origin), self.generation_key(pk)
+        try:
+            entry = self._read(key, generation_key)
+            if entry is not None and entry["fresh_until"] > time.time():
+                CACHE_LOOKUPS.labels(self.name, "hit").inc()
+                return entry["data"]
+            token = self._lock(key)
+            if token is None:
+                if entry is not None:
+                    CACHE_LOOKUPS.labels(self.name, "stale").inc()
+                    return entry["data"]
+                entry = self._wait(key, generation_key)
+                if entry is not None:
+                    CACHE_LOOKUPS.labels(self.name, "coalesced").inc()
+                    return entry["data"]
+        except redis.RedisError:
+            logger.warning("Could not read %s from cache", key, exc_info=True)
+            return build()
+
+        CACHE_LOOKUPS.labels(self.name, "miss").inc()
+        try:
+            generation = self._generation(generation_key)
+            data = build()
+            self._write(key, generation_key, data, generation)
+        finally:
+            if token is not None:
+                self._unlock(key, token)
+        return data
+
+    def invalidate(self, *pks):
+        keys = [self.generation_key(pk) for pk in pks if pk is not None]
+        if not keys:
+            return
+        # a rebuild could read the row again before it is committed
+        transaction.on_commit(lambda: self._expire(keys))
+
+    def _expire(self, generation_keys):
+        # entries of every origin are left to expire, unread
+        try:
+            with get_redis().pipeline() as pipe:
+                for key in generation_keys:
+                    pipe.incr(key)
+                    pipe.expire(key, self._timeout())
+                pipe.execute()
+        except redis.RedisError:
+            logger.error(
+                "Could not invalidate %s", generation_keys, exc_info=True
+            )
+
+    def _timeout(self):
+        return (
+            settings.DETAIL_CACHE_TIMEOUT + settings.DETAIL_CACHE_STALE_TIMEOUT
+        )
+
+    def _generation(self, generation_key):
+        try:
+            generation = get_redis().get(generation_key)
+        except redis.RedisError:
+            return None
+        return generation.decode() if generation is not None else None
+
+    def _read(self, key, generation_key):
+        pipe = get_redis().pipeline(transaction=False)
+        pipe.get(key)
+        pipe.get(generation_key)
+        cached, generation = pipe.execute()
+        if cached is None:
+            return None
+        entry = json.loads(cached)
+        if generation is not None:
+            generation = generation.decode()
+        if entry.get("generation") != generation:
+            return None
+        return entry
+
+    def _write(self, key, generation_key, data, generation=None):
+        entry = {
+            "data": data,
+            "fresh_until": time.time() + settings.DETAIL_CACHE_TIMEOUT,
+            "generation": generation,
+        }
+        try:
+            with get_redis().pipeline() as pipe:
+                pipe.watch(generation_key)
+                current = pipe.get(generation_key)
+                # invalidated while it was built, the data may be outdated
+                if (current.decode() if current else None) != generation:
+                    return
+                pipe.multi()
+                pipe.set(key, json.dumps(entry), ex=self._timeout())
+                pipe.execute()
+        except redis.WatchError:
+            pass
+        except redis.RedisError:
+            logger.warning("Could not write %s to cache", key, exc_info=True)
+
+    def _wait(self, key, generation_key):
+        deadline = time.monotonic() + settings.DETAIL_CACHE_LOCK_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            entry = self._read(key, generation_key)
+            if entry is not None:
+                return entry
+
+    def _lock(self, key):
+        token = uuid.uuid4().hex
+        acquired = get_redis().set(
+            f"lock:{key}",
+            token,
+            nx=True,
+            px=int(settings.DETAIL_CACHE_LOCK_TIMEOUT * 1000),
+        )
+        return token if acquired else None
+
+    def _unlock(self, key, token):
+        # only release the lock if it was not taken over after expiring
+        try:
+            with get_redis().pipeline() as pipe:
+                pipe.watch(f"lock:{key}")
+                if pipe.get(f"lock:{key}") == token.encode():
+                    pipe.multi()
+                    pipe.delete(f"lock:{key}")
+                    pipe.execute()
+        except (redis.WatchError, redis.RedisError):
+            pass
+
+
+class LocalCache(object):
+    """
+    Bounded in-process cache of objects by primary key.
+
+    Entries expire ``timeout`` seconds after they are set, and the least
+    recently used ones are dropped past ``maxsize``. Invalidations are
+    published on a Redis channel that every process listens to from a
+    background thread, so they are seen by all processes; while a process
+    is not subscribed it could miss one, so it bypasses its cache.
+    Callers are handed copies, so changes to them never leak into the cache.
+    """
+
+    def __init__(self, name, maxsize, timeout):
+        self.name = name
+        self.channel = f"invalidate:{name}"
+        self.maxsize = maxsize
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.subscribed = threading.Event()
+        self._pid = None
+
+    def get(self, pk):
+        self._listen()
+        if not self.subscribed.is_set():
+            return None
+        with self.lock:
+            entry = self.entries.get(pk)
+            if entry is not None and entry[1] <= time.monotonic():
+                del self.entries[pk]
+                entry = None
+            if entry is not None:
+                self.entries.move_to_end(pk)
+        if entry is None:
+            CACHE_LOOKUPS.labels(self.name, "miss").inc()
+            return None
+        CACHE_LOOKUPS.labels(self.name, "hit").inc()
+        return copy.deepcopy(entry[0])
+
+    def set(self, pk, value):
+        if not self.subscribed.is_set():
+            return
+        entry = (copy.deepcopy(value), time.monotonic() + self.timeout)
+        with self.lock:
+            self.entries[pk] = entry
+            self.entries.move_to_end(pk)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, *pks):
+        pks = [pk for pk in pks if pk is not None]
+        if not pks:
+            return
+        self._evict(pks)
+        # other processes could read the row again before it is committed
+        transaction.on_commit(lambda: self._publish(pks))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def _evict(self, pks):
+        with self.lock:
+            for pk in pks:
+                self.entries.pop(pk, None)
+
+    def _publish(self, pks):
+        try:
+            get_redis().publish(self.channel, json.dumps(pks))
+        except redis.RedisError:
+            logger.error("Could not invalidate %s", pks, exc_info=True)
+
+    def _listen(self):
+        # one listener per process; a forked child starts its own
+        if self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.subscribed.clear()
+            self.entries.clear()
+            threading.Thread(
+                target=self._run, name=f"{self.name}-invalidation", daemon=True
+            ).start()
+
+    def _run(self):
+        while True:
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.channel)
+                self.subscribed.set()
+                for message in pubsub.listen():
+                    self._evict(json.loads(message["data"]))
+            except redis.RedisError:
+                logger.warning(
+                    "Lost %s invalidations", self.name, exc_info=True
+                )
+            self.subscribed.clear()
+            self.clear()
+            time.sleep(1)
+
+
+post_cache = DetailCache("post")
+user_cache = DetailCache("user")
+auth_user_cache = LocalCache(
+    "auth_user",
+    settings.AUTH_USER_CACHE_SIZE,
+    settings.AUTH_USER_CACHE_TIMEOUT,
+)
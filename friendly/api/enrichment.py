@@ -0,0 +1,187 @@
+import logging
+import os
+import random
+import threading
+import time
+
+import requests
+from django.conf import settings
+from prometheus_client import Counter, Histogram
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+REQUEST_LATENCY = Histogram(
+    "friendly_enrichment_request_seconds",
+    "Latency of enrichment API requests, retries included",
+    ["upstream"],
+)
+REQUEST_ERRORS = Counter(
+    "friendly_enrichment_errors_total",
+    "Failed enrichment API attempts by reason",
+    ["upstream", "reason"],
+)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.RequestException):
+    pass
+
+
+class CircuitBreaker(object):
+    """
+    Stop calling an upstream that keeps failing.
+
+    After ``threshold`` consecutive failures the circuit opens and calls
+    fail straight away for ``reset_timeout`` seconds. Then a single trial
+    call is let through: it closes the circuit if it succeeds and opens it
+    again if it fails.
+    """
+
+    def __init__(self, threshold, reset_timeout):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if self.trial:
+                return False
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self.trial = True
+            return True
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.trial = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            if self.trial or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+            self.trial = False
+
+
+class EnrichmentClient(object):
+    """
+    HTTP client for a third party API used to enrich user data.
+
+    Connections are kept alive in a per-process pool. Every attempt is
+    bounded by ``ENRICHMENT_CONNECT_TIMEOUT`` and ``ENRICHMENT_READ_TIMEOUT``;
+    connection errors, timeouts and 429/5xx responses are retried up to
+    ``ENRICHMENT_RETRIES`` times with jittered exponential backoff, behind a
+    circuit breaker, so that a slow upstream cannot hold a worker for long.
+    """
+
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.breaker = CircuitBreaker(
+            settings.ENRICHMENT_BREAKER_THRESHOLD,
+            settings.ENRICHMENT_BREAKER_RESET_TIMEOUT,
+        )
+        self._session = None
+        self._pid = None
+
+    @property
+    def session(self):
+        # pooled connections must not be shared with forked processes
+        if self._pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=settings.ENRICHMENT_POOL_SIZE
+            )
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session, self._pid = session, os.getpid()
+        return self._session
+
+    def get(self, **params):
+        """
+        Fetch a JSON document from the upstream
+
+        :raises requests.RequestException: once retries are exhausted or
+            the circuit is open
+        """
+
+        if not self.breaker.allow():
+            REQUEST_ERRORS.labels(self.name, "circuit_open").inc()
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        timeout = (
+            settings.ENRICHMENT_CONNECT_TIMEOUT,
+            settings.ENRICHMENT_READ_TIMEOUT,
+        )
+        with REQUEST_LATENCY.labels(self.name).time():
+            attempt = 0
+            while True:
+                try:
+                    data = self.request(params, timeout)
+                except requests.RequestException as e:
+                    reason = self.reason(e)
+                    REQUEST_ERRORS.labels(self.name, reason).inc()
+                    retryable = self.is_retryable(e)
+                    if not retryable or attempt >= settings.ENRICHMENT_RETRIES:
+                        # a rejected request says nothing about its health
+                        if reason == "client_error":
+                            self.breaker.record_success()
+                        else:
+                            self.breaker.record_failure()
+                        # not the exception, its URL holds the API key and
+                        # the user's IP address
+                        response = getattr(e, "response", None)
+                        logger.warning(
+                            "%s request failed: %s (status %s)",
+                            self.name,
+                            reason,
+                            getattr(response, "status_code", None),
+                        )
+                        raise
+                    attempt += 1
+                    backoff = settings.ENRICHMENT_BACKOFF * 2**attempt
+                    time.sleep(random.uniform(0, backoff))
+                else:
+                    self.breaker.record_success()
+                    return data
+
+    def request(self, params, timeout):
+        response = self.session.get(self.url, params=params, timeout=timeout)
+        response.raise_for_status()
+        try:
+            return response.json()
+        except ValueError as e:
+            raise requests.RequestException(e, response=response)
+
+    def is_retryable(self, e):
+        if isinstance(e, requests.HTTPError):
+            return e.response.status_code in RETRY_STATUSES
+        return isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+    def reason(self, e):
+        if isinstance(e, requests.Timeout):
+            return "timeout"
+        if isinstance(e, requests.ConnectionError):
+            return "connection"
+        if isinstance(e, requests.HTTPError):
+            if e.response.status_code in RETRY_STATUSES:
+                return "server_error"
+            return "client_error"
+        return "invalid_response"
+
+
+geoip_api = EnrichmentClient(
+    "geoip", "https://ipgeolocation.abstractapi.com/v1/"
+)
+holiday_api = EnrichmentClient(
+    "holiday", "https://holidays.abstractapi.com/v1/"
+)
@@ -0,0 +1,167 @@
+from itertools import islice
+
+from api.models import Follow, Post, User
+from api.pagination import KeysetPagination
+from api.utils import get_redis
+from django.conf import settings
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.utils.urls import replace_query_param
+
+FAN_OUT_CHUNK_SIZE = 1000
+
+
+def feed_key(user_id):
+    return f"feed:{user_id}"
+
+
+def is_fanned_out_on_read(follower_count):
+    return follower_count >= settings.FEED_FANOUT_THRESHOLD
+
+
+def push_posts(user_ids, posts):
+    """
+    Add posts to the home timelines of the given users
+
+    Each timeline is a Redis sorted set of post ids scored by creation time,
+    trimmed to the newest ``FEED_MAX_LENGTH`` entries.
+    """
+
+    entries = {post.id: post.created_when.timestamp() for post in posts}
+    if not entries:
+        return
+    pipe = get_redis().pipeline(transaction=False)
+    for user_id in user_ids:
+        key = feed_key(user_id)
+        pipe.zadd(key, entries)
+        pipe.zremrangebyrank(key, 0, -settings.FEED_MAX_LENGTH - 1)
+    pipe.execute()
+
+
+def fan_out(post):
+    push_posts([post.author_id], [post])
+    if is_fanned_out_on_read(post.author.follower_count):
+        return
+    followers = (
+        Follow.objects.filter(followee_id=post.author_id)
+        .values_list("follower_id", flat=True)
+        .iterator(chunk_size=FAN_OUT_CHUNK_SIZE)
+    )
+    while True:
+        chunk = list(islice(followers, FAN_OUT_CHUNK_SIZE))
+        if not chunk:
+            break
+        push_posts(chunk, [post])
+
+
+def backfill(follower_id, followee_id):
+    followee = User.objects.only("follower_count").get(pk=followee_id)
+    if is_fanned_out_on_read(followee.follower_count):
+        return
+    posts = Post.objects.filter(author_id=followee_id).order_by(
+        "-created_when", "-id"
+    )
+    push_posts(
+        [follower_id],
+        posts.only("id", "created_when")[: settings.FEED_MAX_LENGTH],
+    )
+
+
+class FeedPagination(KeysetPagination):
+    """
+    Page through a home timeline.
+
+    Posts fanned out on write are read from the user's Redis timeline and
+    merged with the latest posts of followed authors that are too popular
+    to fan out, which are read from the database instead.
+    """
+
+    def paginate_feed(self, queryset, user, request):
+        self.base_url = request.build_absolute_uri()
+        position = self.decode_cursor(request)
+        page_size = self.get_page_size(request)
+
+        follows = Follow.objects.filter(follower=user).values_list(
+            "followee_id", "followee__follower_count"
+        )
+        authors = {user.id}
+        popular = []
+        for followee_id, follower_count in follows:
+            authors.add(followee_id)
+            if is_fanned_out_on_read(follower_count):
+                popular.append(followee_id)
+
+        candidates = self.read_timeline(user, position, page_size)
+        if popular:
+            candidates.update(self.read_popular(popular, position, page_size))
+
+        window = sorted(
+            candidates, key=lambda id: (candidates[id], id), reverse=True
+        )[: page_size + 1]
+        posts = {
+            self.get_value(post, "id"): post
+            for post in queryset.filter(id__in=window).order_by()
+        }
+        self.has_next = len(window) > page_size
+        window = [posts[id] for id in window[:page_size] if id in posts]
+        # posts of authors unfollowed since they were fanned out are
+        # dropped, but still advance the cursor
+        self.last = window[-1] if window else None
+        self.page = [
+            post
+            for post in window
+            if self.get_value(post, "author_id") in authors
+        ]
+        return self.page
+
+    def get_value(self, post, name):
+        # rows of .values() querysets are dicts
+        if isinstance(post, dict):
+            return post[name]
+        return getattr(post, name)
+
+    def read_timeline(self, user, position, page_size):
+        top = "+inf"
+        if position is not None:
+            try:
+                top = parse_datetime(position[0]).timestamp()
+                position = (top, int(position[1]))
+            except (AttributeError, TypeError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        # over-fetch a little so entries tied with the cursor can be skipped
+        entries = get_redis().zrevrangebyscore(
+            feed_key(user.id),
+            top,
+            "-inf",
+            start=0,
+            num=2 * page_size + 1,
+            withscores=True,
+        )
+        timeline = {int(member): score for member, score in entries}
+        if position is not None:
+            timeline = {
+                id: score
+                for id, score in timeline.items()
+                if (score, id) < position
+            }
+        return timeline
+
+    def read_popular(self, authors, position, page_size):
+        posts = Post.objects.filter(author_id__in=authors)
+        if position is not None:
+            posts = posts.filter(self.seek(position))
+        posts = posts.order_by(*self.ordering).values_list(
+            "id", "created_when"
+        )
+        return {
+            id: created_when.timestamp()
+            for id, created_when in posts[: page_size + 1]
+        }
+
+    def get_next_link(self):
+        if not self.has_next or self.last is None:
+            return None
+        cursor = self.encode_cursor(self.get_position(self.last))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
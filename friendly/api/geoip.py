@@ -0,0 +1,156 @@
+import ipaddress
+import json
+import mmap
+import os
+import struct
+
+from django.conf import settings
+
+# File layout: a header, then one fixed size record per network sorted by
+# first address, then the JSON payloads the records point into. Addresses
+# are stored as 16 byte big-endian integers, IPv4 mapped into ::ffff:0:0/96,
+# so comparing the raw bytes compares the addresses.
+MAGIC = b"FGEOIP\x00\x01"
+HEADER = struct.Struct(">8sI4x")
+RECORD = struct.Struct(">16s16sII")
+IPV4_MAPPED = 0xFFFF << 32
+
+_index = None
+
+
+class GeoIPIndex(object):
+    """
+    Read-only view of a geolocation index file.
+
+    The file is memory-mapped rather than read, so every worker process
+    that opens it shares the same pages of the OS page cache, and a lookup
+    is a binary search over the records touching a handful of them.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self.mm)
+        if magic != MAGIC:
+            self.mm.close()
+            raise ValueError(f"{path} is not a geolocation index")
+
+    def __len__(self):
+        return self.count
+
+    def lookup(self, ip):
+        """
+        Find the network an address belongs to
+
+        :param ip: IPv4 or IPv6 address
+        :return: the network's data, or None if it is not in the index
+        """
+
+        try:
+            key = pack_address(ipaddress.ip_address(ip))
+        except ValueError:
+            return None
+
+        mm = self.mm
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = HEADER.size + mid * RECORD.size
+            if mm[offset : offset + 16] <= key:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == 0:
+            return None
+
+        _, end, offset, length = RECORD.unpack_from(
+            mm, HEADER.size + (lo - 1) * RECORD.size
+        )
+        if key > end:
+            return None
+        return json.loads(mm[offset : offset + length])
+
+    def close(self):
+        self.mm.close()
+
+
+def pack_address(address):
+    value = int(address)
+    if address.version == 4:
+        value |= IPV4_MAPPED
+    return value.to_bytes(16, "big")
+
+
+def write_index(path, networks):
+    """
+    Write a geolocation index file
+
+    The file is written next to ``path`` and moved into place, so processes
+    that have the previous index mapped keep reading it undisturbed.
+
+    :param networks: iterable of (network, data) pairs
+    :return: number of networks written
+    """
+
+    ranges = []
+    for network, data in networks:
+        network = ipaddress.ip_network(network, strict=False)
+        ranges.append(
+            (
+                pack_address(network.network_address),
+                pack_address(network.broadcast_address),
+                json.dumps(data, sort_keys=True, separators=(",", ":")),
+            )
+        )
+    ranges.sort()
+    for previous, current in zip(ranges, ranges[1:]):
+        if current[0] <= previous[1]:
+            raise ValueError(
+                "overlapping networks at "
+                f"{ipaddress.ip_address(current[0])}"
+            )
+
+    # networks of the same place share one payload
+    payloads = {}
+    records = []
+    offset = HEADER.size + len(ranges) * RECORD.size
+    for start, end, data in ranges:
+        if data not in payloads:
+            payloads[data] = (offset, len(data.encode()))
+            offset += payloads[data][1]
+        records.append(RECORD.pack(start, end, *payloads[data]))
+
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(records)))
+        f.writelines(records)
+        f.writelines(data.encode() for data in payloads)
+    os.replace(tmp, path)
+    return len(records)
+
+
+def get_index():
+    """
+    Get the process wide index, reopening it once it has been rebuilt
+
+    :return: GeoIPIndex, or None if there is no index file
+    """
+
+    global _index
+    try:
+        inode = os.stat(settings.GEOIP_INDEX_PATH).st_ino
+    except OSError:
+        return None
+    if _index is None or _index.inode != inode:
+        # the old mapping is left for the garbage collector, another
+        # thread may still be reading it
+        _index = GeoIPIndex(settings.GEOIP_INDEX_PATH)
+    return _index
+
+
+def lookup(ip):
+    index = get_index()
+    if index is None:
+        return None
+    return index.lookup(ip)
@@ -0,0 +1,111 @@
+import binascii
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import bcrypt
+from django.conf import settings
+from django.contrib.auth.hashers import BCryptSHA256PasswordHasher
+from prometheus_client import Counter, Gauge, Histogram
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+HASH_SECONDS = Histogram(
+    "friendly_password_hash_seconds",
+    "Time to hash a password in the pool, queueing included",
+)
+HASHES_IN_FLIGHT = Gauge(
+    "friendly_password_hashes_in_flight",
+    "Passwords being hashed or queued for the pool",
+    multiprocess_mode="livesum",
+)
+HASHES_REJECTED = Counter(
+    "friendly_password_hashes_rejected_total",
+    "Password hashes refused because the pool was saturated",
+)
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = "Too many sign-ins in progress, try again shortly."
+    default_code = "hashing_unavailable"
+
+    def __init__(self, wait):
+        super().__init__()
+        self.wait = wait
+
+
+class HashingPool(object):
+    """
+    Bounded process pool that password hashes are run in.
+
+    At most ``PASSWORD_HASHER_POOL_SIZE`` hashes run at once and at most
+    ``PASSWORD_HASHER_MAX_PENDING`` more wait for a free process; past
+    that a hash is refused straight away. Workers run more threads than
+    that, see gunicorn.conf.py, so a burst of logins holds only some of
+    their threads and the rest of it is turned away in milliseconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._pid = None
+
+    def run(self, func, *args):
+        self._start()
+        if not self._slots.acquire(blocking=False):
+            HASHES_REJECTED.inc()
+            raise HashingUnavailable(settings.PASSWORD_HASHER_RETRY_AFTER)
+        HASHES_IN_FLIGHT.inc()
+        try:
+            with HASH_SECONDS.time():
+                try:
+                    return self._executor.submit(func, *args).result()
+                except BrokenProcessPool:
+                    # a pool process died; start over with a fresh pool
+                    self._start(restart=True)
+                    return self._executor.submit(func, *args).result()
+        finally:
+            HASHES_IN_FLIGHT.dec()
+            self._slots.release()
+
+    def _start(self, restart=False):
+        # a forked child must not share its parent's pool
+        if self._pid == os.getpid() and not restart:
+            return
+        with self.lock:
+            if self._pid == os.getpid() and not restart:
+                return
+            if restart and self._executor is not None:
+                self._executor.shutdown(wait=False)
+            else:
+                self._slots = threading.BoundedSemaphore(
+                    settings.PASSWORD_HASHER_POOL_SIZE
+                    + settings.PASSWORD_HASHER_MAX_PENDING
+                )
+            # spawned rather than forked: the pool may be started from a
+            # thread of a process holding locks and connections
+            self._executor = ProcessPoolExecutor(
+                settings.PASSWORD_HASHER_POOL_SIZE,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._pid = os.getpid()
+
+
+pool = HashingPool()
+
+
+class PooledBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    """
+    ``BCryptSHA256PasswordHasher`` with bcrypt run in the hashing pool.
+
+    Hashes are identical, so passwords hashed by either verify with both.
+    """
+
+    def encode(self, password, salt):
+        password = binascii.hexlify(self.digest(password.encode()).digest())
+        data = pool.run(bcrypt.hashpw, password, salt)
+        return "%s$%s" % (self.algorithm, data.decode("ascii"))
@@ -0,0 +1,121 @@
+import datetime
+import json
+import os
+from collections import defaultdict
+from functools import lru_cache
+
+import redis
+import requests
+from api.enrichment import holiday_api
+from api.utils import get_redis
+from django.utils import timezone
+
+
+def holiday_key(country_code, date):
+    return f"holiday:{country_code}:{date.isoformat()}"
+
+
+def calendar_key(country_code, year):
+    return f"holiday:calendar:{country_code}:{year}"
+
+
+def seconds_until_midnight():
+    now = timezone.localtime()
+    midnight = datetime.datetime.combine(
+        now.date() + datetime.timedelta(days=1), datetime.time(), now.tzinfo
+    )
+    return max(int((midnight - now).total_seconds()), 1)
+
+
+def get_holiday_data(country_code):
+    """
+    Get the holidays of a country today
+
+    :return: list of holidays, or None if the holiday API failed
+    """
+
+    try:
+        return get_holidays(country_code, timezone.localdate())
+    except requests.RequestException:
+        return None
+
+
+@lru_cache(maxsize=1024)
+def get_holidays(country_code, date):
+    """
+    Get the holidays of a country on a date
+
+    The answer is looked up, in order, in this process's cache, the day's
+    entry in Redis, the country's preloaded calendar for the year and,
+    failing those, the holiday API. Errors are not cached, so the next
+    call retries the API.
+
+    :return: list of holidays, empty if the date is not one
+    :raises requests.RequestException: if the API could not be reached
+    """
+
+    r = get_redis()
+    key = holiday_key(country_code, date)
+    try:
+        cached = r.get(key)
+        if cached is None:
+            calendar = calendar_key(country_code, date.year)
+            cached = r.hget(calendar, date.isoformat())
+            if cached is None and r.exists(calendar):
+                cached = b"[]"
+    except redis.RedisError:
+        cached = None
+    if cached is not None:
+        return json.loads(cached)
+
+    holidays = fetch(
+        country_code, year=date.year, month=date.month, day=date.day
+    )
+    try:
+        r.set(key, json.dumps(holidays), ex=seconds_until_midnight())
+    except redis.RedisError:
+        pass
+    return holidays
+
+
+def preload(country_code, year):
+    """
+    Store a country's holiday calendar for a year in Redis
+
+    Days missing from the calendar are not holidays, so once it is loaded
+    no lookup for that country and year reaches the API.
+
+    :return: number of holidays in the calendar
+    """
+
+    days = defaultdict(list)
+    holidays = fetch(country_code, year=year)
+    for holiday in holidays:
+        date = datetime.date(
+            int(holiday["date_year"]),
+            int(holiday["date_month"]),
+            int(holiday["date_day"]),
+        )
+        days[date.isoformat()].append(holiday)
+
+    key = calendar_key(country_code, year)
+    pipe = get_redis().pipeline()
+    pipe.delete(key)
+    # the marker keeps the hash, and so the calendar, when there is no holiday
+    pipe.hset(key, "loaded", 1)
+    if days:
+        pipe.hset(
+            key,
+            mapping={date: json.dumps(day) for date, day in days.items()},
+        )
+    pipe.expireat(key, datetime.datetime(year + 1, 1, 31))
+    pipe.execute()
+    return len(holidays)
+
+
+def fetch(country_code, **date):
+    return holiday_api.get(
+        api_key=os.environ.get("ABSTRACT_HOLIDAY_KEY"),
+        country=country_code,
+        **date,
+    )
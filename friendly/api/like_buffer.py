@@ -0,0 +1,204 @@
+import uuid
+from collections import Counter
+from itertools import islice
+
+import redis
+from api.models import Like, Post
+from api.utils import get_redis
+from django.conf import settings
+from django.http import Http404
+
+# Like intents waiting to be written, keyed "<user_id>:<post_id>". Each
+# value is two digits: the desired state, then the state the database had
+# before the intent was buffered, e.g. b"10" for a new like.
+PENDING = "likes:pending"
+# Intents taken out of PENDING by the flush in progress.
+FLUSHING = "likes:flushing"
+# Per post, the like count change buffered but not yet flushed.
+DELTA = "likes:delta"
+FLUSH_LOCK = "lock:likes:flush"
+
+
+def _field(user_id, post_id):
+    return f"{user_id}:{post_id}"
+
+
+def toggle(user_id, post_id):
+    """
+    Buffer a like toggle in Redis
+
+    The acting user reads their own write straight away: their liked state
+    and the post's like count include every intent not yet flushed.
+
+    :return: the post's like count and whether the user now likes it
+    """
+
+    like_count = (
+        Post.objects.filter(pk=post_id)
+        .values_list("like_count", flat=True)
+        .first()
+    )
+    if like_count is None:
+        raise Http404
+
+    delta, liked = _buffer(
+        get_redis(),
+        user_id,
+        post_id,
+        None,
+        lambda: Like.objects.filter(user_id=user_id, post_id=post_id).exists(),
+    )
+    return like_count + delta, liked
+
+
+def apply(intents):
+    """
+    Buffer likes and unlikes in Redis, the write-behind counterpart of
+    ``Like.objects.apply``
+
+    :param intents: mapping of ``(user_id, post_id)`` to ``True`` to like
+        the post or ``False`` to unlike it
+    :return: mapping of post id to its like count, buffered intents
+        included, for the posts that exist
+    """
+
+    like_counts = dict(
+        Post.objects.filter(
+            id__in={post_id for _, post_id in intents}
+        ).values_list("id", "like_count")
+    )
+    intents = {
+        key: like for key, like in intents.items() if key[1] in like_counts
+    }
+    existing = set(
+        Like.objects.filter(
+            post_id__in={post_id for _, post_id in intents},
+            user_id__in={user_id for user_id, _ in intents},
+        ).values_list("user_id", "post_id")
+    )
+    r = get_redis()
+    for (user_id, post_id), like in intents.items():
+        delta, _ = _buffer(
+            r, user_id, post_id, like, lambda: (user_id, post_id) in existing
+        )
+        like_counts[post_id] = like_counts[post_id] + delta
+    return like_counts
+
+
+def _buffer(r, user_id, post_id, like, stored):
+    """
+    Record the intent to like a post, or to toggle the like if ``like`` is
+    None, on top of the intents already buffered
+
+    The intents are read and written in one transaction, retried if a
+    toggle or a flush got in between, so that the deltas never drift.
+
+    :param stored: returns whether the database has the like, for when
+        no intent for it is buffered
+    :return: the post's buffered like count change and whether the user
+        now likes it
+    """
+
+    field = _field(user_id, post_id)
+    with r.pipeline() as pipe:
+        while True:
+            try:
+                pipe.watch(PENDING, FLUSHING)
+                pending = pipe.hget(PENDING, field)
+                flushing = pipe.hget(FLUSHING, field)
+                if pending is not None:
+                    liked, baseline = bool(int(pending[:1])), pending[1:]
+                elif flushing is not None:
+                    # the flush in progress will leave the database in this
+                    # state
+                    liked = bool(int(flushing[:1]))
+                    baseline = flushing[:1]
+                else:
+                    liked = stored()
+                    baseline = b"1" if liked else b"0"
+                wanted = not liked if like is None else like
+
+                pipe.multi()
+                pipe.hset(
+                    PENDING, field, (b"1" if wanted else b"0") + baseline
+                )
+                pipe.hincrby(DELTA, post_id, int(wanted) - int(liked))
+                _, delta = pipe.execute()
+                return delta, wanted
+            except redis.WatchError:
+                continue
+
+
+def flush():
+    """
+    Write buffered like intents to the database in bulk
+
+    :return: number of intents flushed
+    """
+
+    r = get_redis()
+    token = uuid.uuid4().hex
+    if not r.set(FLUSH_LOCK, token, nx=True, ex=settings.LIKES_FLUSH_TIMEOUT):
+        return 0
+    try:
+        # a flush that died half way left its intents in FLUSHING; applying
+        # them again is harmless as intents are desired states
+        if not r.exists(FLUSHING):
+            try:
+                r.rename(PENDING, FLUSHING)
+            except redis.ResponseError:
+                return 0
+
+        entries = r.hgetall(FLUSHING)
+        intents = {}
+        deltas = Counter()
+        for field, value in entries.items():
+            user_id, post_id = map(int, field.split(b":"))
+            liked, baseline = int(value[:1]), int(value[1:])
+            intents[(user_id, post_id)] = bool(liked)
+            deltas[post_id] += liked - baseline
+
+        items = iter(intents.items())
+        while True:
+            chunk = dict(islice(items, settings.LIKES_FLUSH_BATCH_SIZE))
+            if not chunk:
+                break
+            Like.objects.apply(chunk)
+
+        pipe = r.pipeline()
+        for post_id, n in deltas.items():
+            if n:
+                pipe.hincrby(DELTA, post_id, -n)
+        pipe.delete(FLUSHING)
+        pipe.execute()
+        _reset_delta(r)
+        return len(intents)
+    finally:
+        _unlock(r, token)
+
+
+def _unlock(r, token):
+    # only release the lock if it was not taken over after expiring
+    try:
+        with r.pipeline() as pipe:
+            pipe.watch(FLUSH_LOCK)
+            if pipe.get(FLUSH_LOCK) == token.encode():
+                pipe.multi()
+                pipe.delete(FLUSH_LOCK)
+                pipe.execute()
+    except (redis.WatchError, redis.RedisError):
+        pass
+
+
+def _reset_delta(r):
+    # with nothing buffered the deltas must all be zero; clearing them
+    # drops drift from racing toggles by the same user
+    with r.pipeline() as pipe:
+        try:
+            pipe.watch(PENDING)
+            if not pipe.exists(PENDING):
+                pipe.multi()
+                pipe.delete(DELTA)
+                pipe.execute()
+        except redis.WatchError:
+            pass
@@ -0,0 +1,123 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from api.cache import user_cache
+from api.holidays import get_holidays
+from api.models import User
+from api.utils import get_geo_data, get_redis
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+
+CHECKPOINT = "backfill:user_metadata:last_id"
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill in geo_data and created_on_holiday for users that are missing "
+        "them. Progress is checkpointed in Redis, so an interrupted run "
+        "resumes where it stopped."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000)
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=32,
+            help="Lookups in flight at once",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore the checkpoint and start from the first user",
+        )
+
+    def handle(self, chunk_size, concurrency, restart, **options):
+        r = get_redis()
+        if restart:
+            r.delete(CHECKPOINT)
+        last_id = int(r.get(CHECKPOINT) or 0)
+
+        users = (
+            User.objects.filter(
+                Q(geo_data={}) | Q(created_on_holiday={}),
+                signup_ip__isnull=False,
+            )
+            .order_by("id")
+            .values_list(
+                "id",
+                "signup_ip",
+                "geo_data",
+                "created_on_holiday",
+                "created_when",
+            )
+        )
+        updated = 0
+        with ThreadPoolExecutor(concurrency) as executor:
+            while True:
+                # seek rather than offset, and hold one chunk at a time
+                chunk = list(users.filter(id__gt=last_id)[:chunk_size])
+                if not chunk:
+                    break
+                resolved = asyncio.run(
+                    self.resolve(chunk, executor, concurrency)
+                )
+                updated += self.write(chunk, *resolved)
+                last_id = chunk[-1][0]
+                r.set(CHECKPOINT, last_id)
+                self.stdout.write(f"Backfilled up to user {last_id}")
+
+        r.delete(CHECKPOINT)
+        self.stdout.write(self.style.SUCCESS(f"Updated {updated} users"))
+
+    async def resolve(self, chunk, executor, concurrency):
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def run(func, key):
+            async with semaphore:
+                try:
+                    return await loop.run_in_executor(executor, func, key)
+                except requests.RequestException:
+                    return None
+
+        async def gather(func, keys):
+            keys = list(keys)
+            results = await asyncio.gather(*(run(func, key) for key in keys))
+            return dict(zip(keys, results))
+
+        ips = {ip for _, ip, geo_data, _, _ in chunk if not geo_data}
+        geo_data = await gather(get_geo_data, ips)
+
+        days = set()
+        for _, ip, data, holiday_data, created_when in chunk:
+            data = data or geo_data[ip] or {}
+            if holiday_data == {} and data.get("country_code"):
+                days.add(self.holiday_key(data, created_when))
+        holidays = await gather(lambda key: get_holidays(*key), days)
+        return geo_data, holidays
+
+    def write(self, chunk, geo_data, holidays):
+        users = []
+        for id, ip, data, holiday_data, created_when in chunk:
+            user = User(id=id, geo_data=data, created_on_holiday=holiday_data)
+            if not data:
+                user.geo_data = geo_data[ip] or {}
+            if holiday_data == {} and user.geo_data.get("country_code"):
+                key = self.holiday_key(user.geo_data, created_when)
+                if holidays[key] is not None:
+                    user.created_on_holiday = holidays[key]
+            if (
+                user.geo_data != data
+                or user.created_on_holiday != holiday_data
+            ):
+                users.append(user)
+        User.objects.bulk_update(users, ["geo_data", "created_on_holiday"])
+        user_cache.invalidate(*(user.id for user in users))
+        return len(users)
+
+    def holiday_key(self, geo_data, created_when):
+        # the holidays on the day the user signed up, not today's
+        return geo_data["country_code"], timezone.localdate(created_when)
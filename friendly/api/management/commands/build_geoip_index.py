@@ -0,0 +1,36 @@
+import csv
+
+from api import geoip
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the IP geolocation index from a CSV dump with a `network` "
+        "column holding CIDR blocks; the other columns are returned as the "
+        "geo data of addresses in the block."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("csv_path")
+        parser.add_argument(
+            "--output",
+            default=settings.GEOIP_INDEX_PATH,
+            help="Index file to write (default: GEOIP_INDEX_PATH)",
+        )
+
+    def handle(self, csv_path, output, **options):
+        try:
+            with open(csv_path, newline="", encoding="utf-8") as f:
+                count = geoip.write_index(output, self.read_networks(f))
+        except (OSError, KeyError, ValueError) as e:
+            raise CommandError(e)
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {count} networks into {output}")
+        )
+
+    def read_networks(self, f):
+        for row in csv.DictReader(f):
+            network = row.pop("network")
+            yield network, {key: value for key, value in row.items() if value}
@@ -0,0 +1,151 @@
+import asyncio
+import contextvars
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from prometheus_client import Histogram
+
+REQUEST_SECONDS = Histogram(
+    "friendly_request_seconds",
+    "Time to handle a request, by URL name",
+    ["view", "method"],
+)
+REQUEST_QUERIES = Histogram(
+    "friendly_request_queries",
+    "SQL queries issued per request, by URL name",
+    ["view"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, float("inf")),
+)
+REQUEST_SQL_SECONDS = Histogram(
+    "friendly_request_sql_seconds",
+    "Time spent in SQL queries per request, by URL name",
+    ["view"],
+)
+REQUEST_SERIALIZE_SECONDS = Histogram(
+    "friendly_request_serialize_seconds",
+    "Time spent serializing per request, by URL name",
+    ["view"],
+)
+
+# metrics of the request being handled, if it was sampled
+current = contextvars.ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics(object):
+    def __init__(self):
+        self.queries = 0
+        self.sql = 0.0
+        self.timings = {}
+        self._measuring = set()
+
+    @contextmanager
+    def measure(self, name):
+        # nested measurements of the same name, e.g. of nested serializers,
+        # are part of the outer one
+        if name in self._measuring:
+            yield
+            return
+        self._measuring.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._measuring.discard(name)
+            self.timings[name] = (
+                self.timings.get(name, 0.0) + time.perf_counter() - start
+            )
+
+    def server_timing(self, total):
+        timings = [
+            f'db;desc="{self.queries} queries";dur={self.sql * 1000:.1f}'
+        ]
+        timings += [
+            f"{name};dur={seconds * 1000:.1f}"
+            for name, seconds in self.timings.items()
+        ]
+        timings.append(f"total;dur={total * 1000:.1f}")
+        return ", ".join(timings)
+
+
+def count_query(execute, sql, params, many, context):
+    metrics = current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.sql += time.perf_counter() - start
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # installed on every connection rather than around each request, so
+    # that queries made from other threads, as async views do, are seen
+    if count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_query)
+
+
+class RequestMetricsMiddleware(object):
+    """
+    Records the SQL queries, the time spent in them and in serializers,
+    and the total time of a sample of ``REQUEST_METRICS_SAMPLE_RATE`` of
+    the requests, by URL name. Sampled responses carry them in a
+    ``Server-Timing`` header.
+
+    It runs as is under both WSGI and ASGI, so that async views are not
+    handed to a single thread to get through it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # how Django tells that calling the instance returns a coroutine
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.record(request, response, metrics, start)
+
+    async def __acall__(self, request):
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            return await self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        return self.record(request, response, metrics, start)
+
+    def record(self, request, response, metrics, start):
+        total = time.perf_counter() - start
+        match = request.resolver_match
+        view = match.url_name if match and match.url_name else "unmatched"
+        REQUEST_SECONDS.labels(view, request.method).observe(total)
+        REQUEST_QUERIES.labels(view).observe(metrics.queries)
+        REQUEST_SQL_SECONDS.labels(view).observe(metrics.sql)
+        REQUEST_SERIALIZE_SECONDS.labels(view).observe(
+            metrics.timings.get("serialize", 0.0)
+        )
+        response["Server-Timing"] = metrics.server_timing(total)
+        return response
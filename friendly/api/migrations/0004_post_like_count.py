@@ -0,0 +1,32 @@
+# Generated by Django 3.2.6 on 2026-10-18 18:36
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_like_count(apps, schema_editor):
+    Post = apps.get_model('api', 'Post')
+    likes = (
+        Post.likes.through.objects.filter(post_id=OuterRef('pk'))
+        .values('post_id')
+        .annotate(count=Count('*'))
+        .values('count')
+    )
+    Post.objects.update(like_count=Coalesce(Subquery(likes), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_rename_likes_count_post_likes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_like_count, migrations.RunPython.noop),
+    ]
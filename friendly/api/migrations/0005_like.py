@@ -0,0 +1,48 @@
+# Generated by Django 3.2.6 on 2026-10-18 18:37
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_post_like_count'),
+    ]
+
+    operations = [
+        # Promote the auto-created api_post_likes table to an explicit
+        # through model without touching the existing rows.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Like',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.post')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'api_post_likes',
+                        'unique_together': {('post', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='post',
+                    name='likes',
+                    field=models.ManyToManyField(related_name='likes', through='api.Like', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='like',
+            name='created_when',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddIndex(
+            model_name='like',
+            index=models.Index(fields=['post', 'created_when', 'id'], name='like_post_created_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-18 18:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_like'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', 'created_when', 'id'], name='post_author_created_idx'),
+        ),
+    ]
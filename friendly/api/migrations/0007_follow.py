@@ -0,0 +1,38 @@
+# Generated by Django 3.2.6 on 2026-10-18 18:47
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_post_author_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='Follow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_when', models.DateTimeField(default=django.utils.timezone.now)),
+                ('followee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('follower', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('follower', 'followee')},
+            },
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='following',
+            field=models.ManyToManyField(related_name='followers', through='api.Follow', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
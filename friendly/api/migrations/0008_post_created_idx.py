@@ -0,0 +1,17 @@
+# Generated by Django 3.2.6 on 2026-10-18 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_follow'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['created_when', 'id'], name='post_created_idx'),
+        ),
+    ]
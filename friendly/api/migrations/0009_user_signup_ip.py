@@ -0,0 +1,18 @@
+# Generated by Django 3.2.6 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_post_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='signup_ip',
+            field=models.GenericIPAddressField(blank=True, null=True),
+        ),
+    ]
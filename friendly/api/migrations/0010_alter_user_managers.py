@@ -0,0 +1,20 @@
+# Generated by Django 3.2.6 on 2026-10-18 20:27
+
+import api.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_user_signup_ip'),
+    ]
+
+    operations = [
+        migrations.AlterModelManagers(
+            name='user',
+            managers=[
+                ('objects', api.models.UserManager()),
+            ],
+        ),
+    ]
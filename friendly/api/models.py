@@ -1,12 +1,43 @@
 import unicodedata
+from collections import Counter
+from functools import reduce
+from operator import or_
 
 import bcrypt
+from api.cache import auth_user_cache, post_cache, user_cache
 from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import UserManager as BaseUserManager
 from django.core.validators import validate_email
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, F, Q, Value, When
 from django.utils import timezone
 
 
+class UserQuerySet(models.QuerySet):
+    """
+    Users updated or deleted in bulk, by the admin's actions for one, are
+    invalidated in the caches as they are when saved one by one
+    """
+
+    def update(self, **kwargs):
+        pks = list(self.values_list("pk", flat=True))
+        rows = super().update(**kwargs)
+        user_cache.invalidate(*pks)
+        auth_user_cache.invalidate(*pks)
+        return rows
+
+    def delete(self):
+        pks = list(self.values_list("pk", flat=True))
+        result = super().delete()
+        user_cache.invalidate(*pks)
+        auth_user_cache.invalidate(*pks)
+        return result
+
+
+class UserManager(BaseUserManager.from_queryset(UserQuerySet)):
+    pass
+
+
 class User(AbstractUser):
     username = models.CharField(max_length=50, unique=True)
     email = models.EmailField(max_length=50, unique=True)
@@ -14,12 +45,38 @@ class User(AbstractUser):
     password = models.CharField(max_length=100)
     geo_data = models.JSONField(default=dict)
     created_on_holiday = models.JSONField(default=dict)
+    signup_ip = models.GenericIPAddressField(null=True, blank=True)
+    following = models.ManyToManyField(
+        "self",
+        symmetrical=False,
+        related_name="followers",
+        through="Follow",
+        through_fields=("follower", "followee"),
+    )
+    follower_count = models.PositiveIntegerField(default=0)
+
+    objects = UserManager()
 
     REQUIRED_FIELDS = []
 
-    def save(self, *args, **kwargs):
-        super().full_clean(exclude=["geo_data", "created_on_holiday"])
+    def save(self, *args, validate=True, **kwargs):
+        # validate=False is for instances whose unique fields were already
+        # checked, e.g. by a serializer, and spares those checks' queries
+        exclude = ["geo_data", "created_on_holiday"]
+        checked = (self.username, self.email)
+        super().full_clean(exclude=exclude, validate_unique=False)
+        # clean() normalizes the username and email, which may now clash
+        if validate or (self.username, self.email) != checked:
+            super().validate_unique(exclude=exclude)
         super().save(*args, **kwargs)
+        user_cache.invalidate(self.pk)
+        auth_user_cache.invalidate(self.pk)
+
+    def delete(self, *args, **kwargs):
+        pk = self.pk
+        result = super().delete(*args, **kwargs)
+        auth_user_cache.invalidate(pk)
+        return result
 
     def __str__(self):
         return f"{self.__class__.__name__}(id={self.id})"
@@ -28,14 +85,136 @@ class User(AbstractUser):
 class Post(models.Model):
     content = models.CharField(max_length=300)
     created_when = models.DateTimeField(default=timezone.now)
-    likes = models.ManyToManyField(User, related_name="likes")
+    likes = models.ManyToManyField(User, related_name="likes", through="Like")
+    like_count = models.PositiveIntegerField(default=0)
     author = models.ForeignKey(
         User, on_delete=models.PROTECT, related_name="posts"
     )
 
-    def save(self, *args, **kwargs):
-        super().full_clean()
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["created_when", "id"], name="post_created_idx"
+            ),
+            models.Index(
+                fields=["author", "created_when", "id"],
+                name="post_author_created_idx",
+            ),
+        ]
+
+    def save(self, *args, validate=True, **kwargs):
+        super().full_clean(validate_unique=validate)
         super().save(*args, **kwargs)
+        # the author's payload carries their post count
+        post_cache.invalidate(self.pk)
+        user_cache.invalidate(self.author_id)
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(id={self.id})"
+
+
+class LikeManager(models.Manager):
+    def apply(self, intents):
+        """
+        Like or unlike posts in bulk
+
+        :param intents: mapping of ``(user_id, post_id)`` to ``True`` to like
+            the post or ``False`` to unlike it
+        :return: mapping of post id to its updated like count, for the posts
+            that exist
+        """
+
+        with transaction.atomic():
+            # lock in id order so that concurrent batches cannot deadlock
+            like_counts = dict(
+                Post.objects.select_for_update()
+                .filter(id__in={post_id for _, post_id in intents})
+                .order_by("id")
+                .values_list("id", "like_count")
+            )
+            intents = {
+                key: like
+                for key, like in intents.items()
+                if key[1] in like_counts
+            }
+            existing = set(
+                self.filter(
+                    post_id__in={post_id for _, post_id in intents},
+                    user_id__in={user_id for user_id, _ in intents},
+                ).values_list("user_id", "post_id")
+            )
+            created = [
+                key
+                for key, like in intents.items()
+                if like and key not in existing
+            ]
+            deleted = [
+                key
+                for key, like in intents.items()
+                if not like and key in existing
+            ]
+            if created:
+                self.bulk_create(
+                    [Like(user_id=u, post_id=p) for u, p in created],
+                    ignore_conflicts=True,
+                )
+            if deleted:
+                self.filter(
+                    reduce(or_, (Q(user_id=u, post_id=p) for u, p in deleted))
+                ).delete()
+
+            deltas = Counter(post_id for _, post_id in created)
+            deltas.subtract(post_id for _, post_id in deleted)
+            deltas = {post_id: n for post_id, n in deltas.items() if n}
+            if deltas:
+                Post.objects.filter(id__in=deltas).update(
+                    like_count=F("like_count")
+                    + Case(
+                        *(
+                            When(id=p, then=Value(n))
+                            for p, n in deltas.items()
+                        ),
+                        default=Value(0),
+                    )
+                )
+            for post_id, n in deltas.items():
+                like_counts[post_id] += n
+        post_cache.invalidate(*deltas)
+        return like_counts
+
+
+class Like(models.Model):
+    post = models.ForeignKey(Post, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_when = models.DateTimeField(default=timezone.now)
+
+    objects = LikeManager()
+
+    class Meta:
+        db_table = "api_post_likes"
+        unique_together = [("post", "user")]
+        indexes = [
+            models.Index(
+                fields=["post", "created_when", "id"],
+                name="like_post_created_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(id={self.id})"
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+"
+    )
+    followee = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="+"
+    )
+    created_when = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = [("follower", "followee")]
 
     def __str__(self):
         return f"{self.__class__.__name__}(id={self.id})"
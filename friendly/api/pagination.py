@@ -0,0 +1,131 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Paginate by seeking past the last row of the previous page.
+
+    Unlike page numbers this never issues a ``COUNT(*)`` nor an ``OFFSET``,
+    so a page costs the same however deep into the table it is, as long as
+    an index matches ``ordering``.
+    """
+
+    ordering = ("-created_when", "-id")
+    page_size = api_settings.PAGE_SIZE
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        return self.get_page(
+            queryset, self.decode_cursor(request), self.get_page_size(request)
+        )
+
+    def first_page(self, queryset, url):
+        self.base_url = url
+        return self.get_page(queryset, None, self.page_size)
+
+    def get_page(self, queryset, position, page_size):
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            try:
+                queryset = queryset.filter(self.seek(position))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        rows = list(queryset[: page_size + 1])
+        self.page = rows[:page_size]
+        self.has_next = len(rows) > page_size
+        return self.page
+
+    def seek(self, position):
+        # (a, b) < (x, y) is spelled a < x OR (a = x AND b < y); the extra
+        # bound on the leading column lets the planner start the index scan
+        # at the cursor rather than filter its way there.
+        bound = None
+        seek = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            if bound is None:
+                bound = Q(**{f"{name}__{lookup}e": value})
+            seek |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return bound & seek
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_position(self, row):
+        position = []
+        for field in self.ordering:
+            # rows of .values() querysets are dicts
+            if isinstance(row, dict):
+                value = row[field.lstrip("-")]
+            else:
+                value = getattr(row, field.lstrip("-"))
+            if isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            position.append(value)
+        return position
+
+    def encode_cursor(self, position):
+        cursor = json.dumps(position, separators=(",", ":")).encode()
+        return base64.urlsafe_b64encode(cursor).decode("ascii")
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor is None:
+            return None
+        try:
+            position = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(
+            self.ordering
+        ):
+            raise NotFound(self.invalid_cursor_message)
+        return position
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        cursor = self.encode_cursor(self.get_position(self.page[-1]))
+        return replace_query_param(
+            self.base_url, self.cursor_query_param, cursor
+        )
+
+    def get_paginated_data(self, data):
+        return OrderedDict([("next", self.get_next_link()), ("results", data)])
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,36 @@
+import io
+
+import orjson
+from api.renderers import NUMERALS, ORJSONRenderer
+from django.conf import settings
+from rest_framework import parsers
+
+# integers that may not fit in 64 bits, which orjson reads as floats
+LONG_INTEGER = b"0" * 19
+
+
+class ORJSONParser(parsers.JSONParser):
+    """
+    ``JSONParser`` that decodes with orjson.
+
+    Bodies orjson cannot read the same way, invalid or not UTF-8 encoded
+    ones and those with very long integers, are left to ``JSONParser``,
+    which also words the parse errors.
+    """
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        body = stream.read()
+        if (
+            self.strict
+            and encoding.lower().replace("_", "-") in ("utf-8", "utf8")
+            and LONG_INTEGER not in body.translate(NUMERALS)
+        ):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass
+        return super().parse(io.BytesIO(body), media_type, parser_context)
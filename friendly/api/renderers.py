@@ -0,0 +1,89 @@
+import math
+from decimal import Decimal
+
+import orjson
+from rest_framework import renderers
+
+# Turns every digit into "0" and every other byte but the ones of an
+# exponent into a space, so that numbers can be spotted with plain, fast
+# substring searches rather than a regular expression
+NUMERALS = bytes(
+    ord("0") if byte in b"0123456789" else byte if byte in b"e+-" else 32
+    for byte in range(256)
+)
+
+
+def has_mismatched_floats(data):
+    """
+    Whether orjson may have written a float differently from json
+
+    It writes floats below 1e-4 without an exponent, and exponents without
+    a sign or zero padding.
+    """
+
+    if b"0.0000" in data:
+        return True
+    numerals = data.translate(NUMERALS)
+    return b"0e0" in numerals or b"0e-0" in numerals or b"0e+0" in numerals
+
+
+def has_non_finite_floats(data):
+    """
+    Whether there is a NaN or an infinity in data, which orjson writes as
+    ``null`` where json refuses it
+    """
+
+    if isinstance(data, float):
+        return not math.isfinite(data)
+    if isinstance(data, Decimal):
+        return not data.is_finite()
+    if isinstance(data, dict):
+        return any(has_non_finite_floats(value) for value in data.values())
+    if isinstance(data, (list, tuple)):
+        return any(has_non_finite_floats(item) for item in data)
+    return False
+
+
+class ORJSONRenderer(renderers.JSONRenderer):
+    """
+    ``JSONRenderer`` that encodes with orjson.
+
+    The output is byte for byte that of ``JSONRenderer``: anything orjson
+    would write differently, floats in exponent notation, integers past
+    64 bits and indented output among them, is rendered by
+    ``JSONRenderer`` instead. So is data with NaN or infinities, which
+    ``JSONRenderer`` refuses; it is only looked for when the output has a
+    ``null``, as orjson writes them.
+    """
+
+    options = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        if (
+            indent is not None
+            or self.ensure_ascii
+            or not self.compact
+            or not self.strict
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.default, option=self.options)
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        if has_mismatched_floats(ret) or (
+            b"null" in ret and has_non_finite_floats(data)
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        # a strict javascript subset, as JSONRenderer escapes them too
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(
+            b"\xe2\x80\xa9", b"\\u2029"
+        )
+
+    def default(self, obj):
+        # decimals, lazy strings, querysets and the like
+        return self.encoder_class().default(obj)
@@ -1,23 +1,300 @@
-from api.models import Post, User
+import copy
+from collections import OrderedDict
+
+from api import metrics
+from api.models import Like, Post, User
+from api.pagination import KeysetPagination
+from api.tokens import RefreshToken
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import models
+from django.db.models import Count
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
 
 
-class PostSerializer(serializers.ModelSerializer):
-    author = serializers.HyperlinkedRelatedField(
-        read_only=True, view_name="user-detail"
-    )
+class ValidatedModelSerializer(serializers.ModelSerializer):
+    """
+    ``ModelSerializer`` that saves without the model checking uniqueness
+    again.
+
+    The serializer has run the unique checks by then, so the model's would
+    only repeat their queries. What the model's ``full_clean`` still
+    rejects is reported as the serializer's own validation errors.
+    """
+
+    def create(self, validated_data):
+        instance = self.Meta.model(**validated_data)
+        self.save_instance(instance)
+        return instance
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        self.save_instance(instance, update_fields=list(validated_data))
+        return instance
+
+    def save_instance(self, instance, **kwargs):
+        try:
+            instance.save(validate=False, **kwargs)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(
+                serializers.as_serializer_error(exc)
+            )
+
+
+# stands in for the lookup value when reversing a URL template
+URL_PLACEHOLDER = 9876543210123
+
+
+class TemplatedHyperlinkMixin(object):
+    """
+    Builds links by filling in a URL template instead of reversing one for
+    every object.
+
+    The template is reversed once per field, so once per serializer, or
+    per list of objects serialized together.
+    """
+
+    def get_url(self, obj, view_name, request, format):
+        if hasattr(obj, "pk") and obj.pk in (None, ""):
+            return None
+        lookup_value = getattr(obj, self.lookup_field)
+        if not isinstance(lookup_value, int):
+            return super().get_url(obj, view_name, request, format)
+        templates = self.__dict__.setdefault("_url_templates", {})
+        if format not in templates:
+            url = self.reverse(
+                view_name,
+                kwargs={self.lookup_url_kwarg: URL_PLACEHOLDER},
+                request=request,
+                format=format,
+            )
+            head, _, tail = url.rpartition(str(URL_PLACEHOLDER))
+            templates[format] = head, tail
+        head, tail = templates[format]
+        return f"{head}{lookup_value}{tail}"
+
+
+class TemplatedRelatedField(
+    TemplatedHyperlinkMixin, serializers.HyperlinkedRelatedField
+):
+    pass
+
+
+class TemplatedIdentityField(
+    TemplatedHyperlinkMixin, serializers.HyperlinkedIdentityField
+):
+    pass
+
+
+class ValuesRow(object):
+    """
+    Stand-in for a model instance, made from a ``.values()`` row.
+
+    It has what serializer fields read from an instance: columns by
+    attribute name, ``pk`` and ``serializable_value``, enough for plain
+    fields and links by primary key.
+    """
+
+    serializable_value = models.Model.serializable_value
+
+    def __init__(self, model, values):
+        self.__dict__.update(values)
+        self._meta = model._meta
+        self.pk = values[model._meta.pk.attname]
+
+
+class CompiledModelSerializer(ValidatedModelSerializer):
+    """
+    ``ModelSerializer`` that builds its fields once per class.
+
+    ``ModelSerializer`` introspects the model for its fields every time it
+    is instantiated; here they are built the first time and copied after
+    that, so they must not depend on the context or the instance.
+
+    ``fields`` limits the fields to the given ones, and ``expand`` swaps
+    the named ``Meta.expandable_fields``, links by default, for the nested
+    objects. ``Meta.annotations`` are the queryset annotations that fields
+    read, made by ``prune`` and ``select_values`` only when those fields
+    are wanted.
+
+    ``select_values`` and ``from_values`` serialize rows fetched with
+    ``.values()``, sparing building model instances. Every field must then
+    read a column, an annotation or the primary key.
+    """
+
+    def __init__(self, *args, fields=None, expand=(), **kwargs):
+        self.sparse_fields = fields
+        self.expanded_fields = expand
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        cls = type(self)
+        if "_compiled_fields" not in cls.__dict__:
+            cls._compiled_fields = super().get_fields()
+        fields = OrderedDict()
+        for name, field in cls._compiled_fields.items():
+            if self.sparse_fields is None or name in self.sparse_fields:
+                fields[name] = copy.deepcopy(field)
+        for name in self.expanded_fields:
+            fields[name] = self.Meta.expandable_fields[name](read_only=True)
+        return fields
+
+    def to_representation(self, instance):
+        request_metrics = metrics.current.get()
+        if request_metrics is None:
+            return super().to_representation(instance)
+        with request_metrics.measure("serialize"):
+            return super().to_representation(instance)
+
+    @classmethod
+    def get_model_fields(cls, fields=None):
+        opts = cls.Meta.model._meta
+        model_fields = [opts.pk]
+        for field in cls(fields=fields)._readable_fields:
+            if field.source == "*":
+                continue
+            try:
+                model_field = opts.get_field(field.source_attrs[0])
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete:
+                model_fields.append(model_field)
+        return list(dict.fromkeys(model_fields))
+
+    @classmethod
+    def get_value_columns(cls, fields=None):
+        return [field.attname for field in cls.get_model_fields(fields)]
+
+    @classmethod
+    def get_annotations(cls, fields=None):
+        return {
+            name: annotation
+            for name, annotation in getattr(
+                cls.Meta, "annotations", {}
+            ).items()
+            if fields is None or name in fields
+        }
+
+    @classmethod
+    def prune(cls, queryset, fields=None, expand=(), columns=()):
+        """
+        Load only what the serializer reads
+
+        :param columns: other columns to load, e.g. to paginate by
+        :return: ``queryset`` with the other columns deferred, the wanted
+            annotations and the expanded relations joined in
+        """
+
+        only = [field.name for field in cls.get_model_fields(fields)]
+        for name in expand:
+            only += [
+                f"{name}__{field.name}"
+                for field in cls.Meta.expandable_fields[
+                    name
+                ].get_model_fields()
+            ]
+        return (
+            queryset.annotate(**cls.get_annotations(fields))
+            .select_related(*expand)
+            .only(*only, *columns)
+        )
+
+    @classmethod
+    def select_values(cls, queryset, fields=None, columns=()):
+        """
+        Narrow ``queryset`` to the values the serializer reads
+
+        :param columns: other columns to select, e.g. to paginate by
+        :return: ``.values()`` queryset of the columns and annotations
+        """
+
+        queryset = queryset.annotate(**cls.get_annotations(fields))
+        return queryset.values(
+            *cls.get_value_columns(fields),
+            *columns,
+            *queryset.query.annotations,
+        )
+
+    @classmethod
+    def from_values(cls, rows, **kwargs):
+        """
+        Serializer of many rows from ``select_values``
+        """
+
+        model = cls.Meta.model
+        return cls(
+            [ValuesRow(model, row) for row in rows], many=True, **kwargs
+        )
+
+
+class AuthorSerializer(CompiledModelSerializer):
+    posts = TemplatedIdentityField(view_name="user-posts")
+
+    class Meta:
+        model = User
+        fields = ["id", "username", "created_when", "posts"]
+
+
+class PostSerializer(CompiledModelSerializer):
+    author = TemplatedRelatedField(read_only=True, view_name="user-detail")
 
     class Meta:
         model = Post
-        fields = ["id", "content", "author", "created_when", "likes"]
-        extra_kwargs = {"likes": {"required": False}}
+        fields = [
+            "id",
+            "content",
+            "author",
+            "created_when",
+            "like_count",
+        ]
+        extra_kwargs = {"like_count": {"read_only": True}}
+        expandable_fields = {"author": AuthorSerializer}
 
 
-class UserSerializer(serializers.ModelSerializer):
-    posts = serializers.HyperlinkedRelatedField(
-        read_only=True, many=True, view_name="post-detail", required=False
+class LikeSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Like
+        fields = ["user", "created_when"]
+
+
+class LikeIntentSerializer(serializers.Serializer):
+    post = serializers.IntegerField(min_value=1)
+    like = serializers.BooleanField()
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    likes = serializers.ListField(
+        child=LikeIntentSerializer(),
+        allow_empty=False,
+        max_length=settings.LIKES_BATCH_MAX_SIZE,
     )
 
+
+class PostDetailSerializer(PostSerializer):
+    likes = serializers.SerializerMethodField()
+
+    class Meta(PostSerializer.Meta):
+        fields = PostSerializer.Meta.fields + ["likes"]
+
+    def get_likes(self, obj):
+        request = self.context["request"]
+        url = reverse("post-likes", kwargs={"pk": obj.pk}, request=request)
+        paginator = KeysetPagination()
+        page = paginator.first_page(obj.like_set.all(), url)
+        return paginator.get_paginated_data(
+            LikeSerializer(page, many=True).data
+        )
+
+
+class UserSerializer(CompiledModelSerializer):
+    posts = TemplatedIdentityField(view_name="user-posts")
+    post_count = serializers.SerializerMethodField()
+
     class Meta:
         model = User
         fields = [
@@ -27,16 +304,40 @@ class UserSerializer(serializers.ModelSerializer):
             "created_when",
             "geo_data",
             "posts",
+            "post_count",
             "password",
             "created_on_holiday",
         ]
         extra_kwargs = {
             "password": {"write_only": True},
         }
+        annotations = {"post_count": Count("posts")}
 
     def create(self, validated_data):
         password = validated_data.pop("password")
         instance = self.Meta.model(**validated_data)
         instance.set_password(password)
-        instance.save()
+        self.save_instance(instance)
+        instance.post_count = 0
         return instance
+
+    def get_post_count(self, obj):
+        # the count is annotated so that it rides along with the user row
+        if hasattr(obj, "post_count"):
+            return obj.post_count
+        return obj.posts.count()
+
+
+class RefreshSerializer(TokenRefreshSerializer):
+    # TokenRefreshSerializer hardcodes simplejwt's RefreshToken, whose
+    # blacklist check queries the database
+    def validate(self, attrs):
+        refresh = RefreshToken(attrs["refresh"])
+        data = {"access": str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            data["refresh"] = str(refresh)
+        return data
@@ -1,11 +1,34 @@
+from datetime import timedelta
+
+import fakeredis
 import pytest
-from api.models import Post, User
+from api import utils
+from api.cache import auth_user_cache
+from api.models import Like, Post, User
 from api.tests import PostData, UserData
 from django.utils import timezone
 from rest_framework.test import APIClient
 from rest_framework_simplejwt.tokens import RefreshToken
 
 
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+@pytest.fixture(autouse=True)
+def redis_client(monkeypatch, redis_server):
+    client = fakeredis.FakeRedis(server=redis_server)
+    monkeypatch.setattr(utils, "_redis", client)
+    return client
+
+
+@pytest.fixture(autouse=True)
+def clear_auth_user_cache():
+    # ids are reused once a test's transaction is rolled back
+    auth_user_cache.clear()
+
+
 @pytest.fixture
 def now():
     return timezone.now()
@@ -55,6 +78,45 @@ def post(post_data, now, valid_user):
     )
 
 
+@pytest.fixture
+def other_user(now):
+    return User.objects.create(
+        username="@other", email="other@example.com", password="!"
+    )
+
+
+@pytest.fixture
+def posts(now, valid_user):
+    return [
+        Post.objects.create(
+            content=f"post {i}",
+            # two posts share a timestamp to exercise the id tie-breaker
+            created_when=now + timedelta(seconds=i // 2),
+            author=valid_user,
+        )
+        for i in range(11)
+    ]
+
+
+@pytest.fixture
+def likers(post, now):
+    users = [
+        User.objects.create(
+            username=f"liker{i}", email=f"liker{i}@example.com", password="!"
+        )
+        for i in range(12)
+    ]
+    Like.objects.bulk_create(
+        # two likes share a timestamp to exercise the id tie-breaker
+        Like(
+            post=post, user=user, created_when=now + timedelta(seconds=i // 2)
+        )
+        for i, user in enumerate(users)
+    )
+    Post.objects.filter(pk=post.pk).update(like_count=len(users))
+    return users
+
+
 @pytest.fixture
 def api_client():
     return APIClient()
@@ -66,3 +128,11 @@ def api_client_with_token(valid_user):
     refresh = RefreshToken.for_user(valid_user)
     client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
     return client
+
+
+@pytest.fixture
+def other_client_with_token(other_user):
+    client = APIClient()
+    refresh = RefreshToken.for_user(other_user)
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {refresh.access_token}")
+    return client
@@ -0,0 +1,161 @@
+import json
+from unittest.mock import patch
+
+import pytest
+from api import async_views, views
+from asgiref.sync import async_to_sync
+from rest_framework import status
+from rest_framework.permissions import BasePermission
+from rest_framework.throttling import BaseThrottle
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+
+@pytest.fixture
+def auth(valid_user):
+    refresh = RefreshToken.for_user(valid_user)
+    return {"HTTP_AUTHORIZATION": f"Bearer {refresh.access_token}"}
+
+
+class DenyAll(BasePermission):
+    def has_permission(self, request, view):
+        return False
+
+
+class ThrottleAll(BaseThrottle):
+    def allow_request(self, request, view):
+        return False
+
+    def wait(self):
+        return 10
+
+
+def call(view_class, request, **kwargs):
+    response = async_to_sync(view_class.as_view())(request, **kwargs)
+    return response.status_code, json.loads(response.content), response
+
+
+# handlers run on other threads, with their own database connections
+@pytest.mark.django_db(transaction=True)
+class TestAsyncViews(object):
+    factory = APIRequestFactory()
+
+    def test_get_post(self, post, auth):
+        request = self.factory.get(f"/post/{post.pk}/", **auth)
+
+        code, data, _ = call(async_views.PostDetailView, request, pk=post.pk)
+
+        assert code == status.HTTP_200_OK
+        assert data["id"] == post.pk
+        assert data["content"] == post.content
+
+    def test_get_missing_post(self, auth):
+        request = self.factory.get("/post/1000/", **auth)
+
+        code, _, _ = call(async_views.PostDetailView, request, pk=1000)
+
+        assert code == status.HTTP_404_NOT_FOUND
+
+    def test_unauthenticated(self, post):
+        request = self.factory.get(f"/post/{post.pk}/")
+
+        code, _, response = call(
+            async_views.PostDetailView, request, pk=post.pk
+        )
+
+        assert code == status.HTTP_401_UNAUTHORIZED
+        assert response["WWW-Authenticate"].startswith("Bearer")
+
+    def test_toggle_like(self, post, auth):
+        request = self.factory.put(f"/likes/{post.pk}/", **auth)
+        code, data, _ = call(async_views.LikesView, request, pk=post.pk)
+
+        assert code == status.HTTP_200_OK
+        assert data == {"id": post.pk, "like_count": 1, "liked": True}
+
+        request = self.factory.put(f"/likes/{post.pk}/", **auth)
+        _, data, _ = call(async_views.LikesView, request, pk=post.pk)
+
+        assert data == {"id": post.pk, "like_count": 0, "liked": False}
+
+    def test_get_user(self, valid_user, auth):
+        request = self.factory.get(f"/user/{valid_user.pk}/", **auth)
+
+        code, data, _ = call(
+            async_views.UserDetailView, request, pk=valid_user.pk
+        )
+
+        assert code == status.HTTP_200_OK
+        assert data["username"] == valid_user.username
+
+    def test_create_user(self, user_data):
+        request = self.factory.post(
+            "/user/", data=user_data.to_dict(), format="json"
+        )
+
+        code, data, _ = call(async_views.UserListView, request)
+
+        assert code == status.HTTP_201_CREATED
+        assert data["username"] == user_data.username
+
+    def test_login(self, valid_user, user_data):
+        request = self.factory.post(
+            "/login/",
+            data={
+                "username": user_data.username,
+                "password": user_data.password,
+            },
+            format="json",
+        )
+
+        code, data, _ = call(async_views.TokenObtainPairView, request)
+
+        assert code == status.HTTP_200_OK
+        assert {"access", "refresh"} <= data.keys()
+
+    def test_create_post(self, valid_user, auth):
+        request = self.factory.post(
+            "/post/", data={"content": "Hello"}, format="json", **auth
+        )
+
+        with patch("api.views.fan_out_post.delay"):
+            code, data, _ = call(async_views.PostListView, request)
+
+        assert code == status.HTTP_201_CREATED
+        assert data["content"] == "Hello"
+
+    def test_method_not_allowed(self, post, auth):
+        request = self.factory.get(f"/likes/{post.pk}/", **auth)
+
+        code, _, _ = call(async_views.LikesView, request, pk=post.pk)
+
+        assert code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+    def test_checks_view_permissions(self, post, auth):
+        class DeniedView(async_views.PostDetailView):
+            view_class = type(
+                "DeniedPostDetailView",
+                (views.PostDetailView,),
+                {"permission_classes": (DenyAll,)},
+            )
+
+        request = self.factory.get(f"/post/{post.pk}/", **auth)
+
+        code, _, _ = call(DeniedView, request, pk=post.pk)
+
+        assert code == status.HTTP_403_FORBIDDEN
+
+    def test_checks_view_throttles(self, post, auth):
+        class ThrottledView(async_views.PostDetailView):
+            view_class = type(
+                "ThrottledPostDetailView",
+                (views.PostDetailView,),
+                {"throttle_classes": (ThrottleAll,)},
+            )
+
+        request = self.factory.get(f"/post/{post.pk}/", **auth)
+
+        code, _, response = call(ThrottledView, request, pk=post.pk)
+
+        assert code == status.HTTP_429_TOO_MANY_REQUESTS
+        assert response["Retry-After"] == "10"
@@ -0,0 +1,91 @@
+import datetime
+from unittest.mock import patch
+
+import pytest
+import requests
+from api.management.commands.backfill_user_metadata import CHECKPOINT
+from api.models import User
+from django.core.management import call_command
+
+COMMAND = "api.management.commands.backfill_user_metadata"
+GEO_DATA = {"1.1.1.1": {"country_code": "KE"}, "2.2.2.2": None}
+
+
+@pytest.fixture
+def users():
+    created_when = datetime.datetime(
+        2026, 6, 1, 12, tzinfo=datetime.timezone.utc
+    )
+    return [
+        User.objects.create(
+            username=f"@user{i}",
+            email=f"user{i}@example.com",
+            password="!",
+            created_when=created_when,
+            signup_ip=ip,
+        )
+        for i, ip in enumerate(["1.1.1.1", "1.1.1.1", "2.2.2.2", None])
+    ]
+
+
+@pytest.fixture
+def lookups():
+    with patch(f"{COMMAND}.get_geo_data") as get_geo_data, patch(
+        f"{COMMAND}.get_holidays"
+    ) as get_holidays:
+        get_geo_data.side_effect = GEO_DATA.get
+        get_holidays.return_value = [{"name": "Madaraka Day"}]
+        yield get_geo_data, get_holidays
+
+
+@pytest.mark.django_db
+class TestBackfillUserMetadata(object):
+    def test_backfill(self, users, lookups, redis_client):
+        get_geo_data, get_holidays = lookups
+
+        call_command("backfill_user_metadata", "--chunk-size", "2")
+
+        for user in users:
+            user.refresh_from_db()
+        assert [user.geo_data for user in users] == [
+            {"country_code": "KE"},
+            {"country_code": "KE"},
+            {},
+            {},
+        ]
+        assert users[0].created_on_holiday == [{"name": "Madaraka Day"}]
+        assert users[2].created_on_holiday == {}
+        get_holidays.assert_called_once_with("KE", datetime.date(2026, 6, 1))
+        assert get_geo_data.call_count == 2
+        assert not redis_client.exists(CHECKPOINT)
+
+    def test_resumes_from_checkpoint(self, users, lookups, redis_client):
+        redis_client.set(CHECKPOINT, users[0].id)
+
+        call_command("backfill_user_metadata")
+
+        users[0].refresh_from_db()
+        users[1].refresh_from_db()
+        assert users[0].geo_data == {}
+        assert users[1].geo_data == {"country_code": "KE"}
+
+    def test_restart(self, users, lookups, redis_client):
+        redis_client.set(CHECKPOINT, users[-1].id)
+
+        call_command("backfill_user_metadata", "--restart")
+
+        users[0].refresh_from_db()
+        assert users[0].geo_data == {"country_code": "KE"}
+
+    def test_only_missing_holidays(self, users, lookups):
+        _, get_holidays = lookups
+        User.objects.filter(pk=users[0].pk).update(
+            geo_data={"country_code": "UG"}
+        )
+        get_holidays.side_effect = requests.ConnectionError
+
+        call_command("backfill_user_metadata")
+
+        users[0].refresh_from_db()
+        assert users[0].geo_data == {"country_code": "UG"}
+        assert users[0].created_on_holiday == {}
@@ -0,0 +1,338 @@
+import json
+import time
+from unittest.mock import patch
+
+import pytest
+from api.authentication import CachedJWTAuthentication
+from api.cache import LocalCache, auth_user_cache, post_cache, user_cache
+from api.models import User
+from django.http import Http404
+from prometheus_client import REGISTRY
+from rest_framework.reverse import reverse
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+def lookups(name, result):
+    value = REGISTRY.get_sample_value(
+        "friendly_detail_cache_lookups_total",
+        {"name": name, "result": result},
+    )
+    return value or 0
+
+
+@pytest.mark.django_db
+class TestDetailCache(object):
+    def fail(self):
+        raise AssertionError("should not rebuild")
+
+    def test_post_detail_reread_is_a_hit(
+        self, api_client_with_token, post, django_assert_max_num_queries
+    ):
+        url = reverse("post-detail", kwargs={"pk": post.id})
+        hits, misses = lookups("post", "hit"), lookups("post", "miss")
+        first = api_client_with_token.get(url)
+
+        # only the token's user is looked up
+        with django_assert_max_num_queries(1):
+            second = api_client_with_token.get(url)
+
+        assert second.data == first.data
+        assert lookups("post", "miss") == misses + 1
+        assert lookups("post", "hit") == hits + 1
+
+    def test_user_detail_reread_is_a_hit(
+        self, api_client_with_token, valid_user
+    ):
+        url = reverse("user-detail", kwargs={"pk": valid_user.id})
+        hits = lookups("user", "hit")
+        api_client_with_token.get(url)
+        api_client_with_token.get(url)
+
+        assert lookups("user", "hit") == hits + 1
+
+    def test_like_invalidates_post(
+        self, api_client_with_token, post, django_capture_on_commit_callbacks
+    ):
+        url = reverse("post-detail", kwargs={"pk": post.id})
+        api_client_with_token.get(url)
+        with django_capture_on_commit_callbacks(execute=True):
+            api_client_with_token.put(reverse("likes", kwargs={"pk": post.id}))
+        response = api_client_with_token.get(url)
+
+        assert response.data["like_count"] == 1
+
+    def test_post_save_invalidates_post(
+        self, api_client_with_token, post, django_capture_on_commit_callbacks
+    ):
+        url = reverse("post-detail", kwargs={"pk": post.id})
+        api_client_with_token.get(url)
+        post.content = "edited"
+        with django_capture_on_commit_callbacks(execute=True):
+            post.save()
+        response = api_client_with_token.get(url)
+
+        assert response.data["content"] == "edited"
+
+    def test_user_save_invalidates_user(
+        self,
+        api_client_with_token,
+        valid_user,
+        django_capture_on_commit_callbacks,
+    ):
+        url = reverse("user-detail", kwargs={"pk": valid_user.id})
+        api_client_with_token.get(url)
+        valid_user.geo_data = {"country_code": "KE"}
+        with django_capture_on_commit_callbacks(execute=True):
+            valid_user.save()
+        response = api_client_with_token.get(url)
+
+        assert response.data["geo_data"] == {"country_code": "KE"}
+
+    def test_new_post_invalidates_author(
+        self,
+        api_client_with_token,
+        valid_user,
+        post_data,
+        django_capture_on_commit_callbacks,
+    ):
+        url = reverse("user-detail", kwargs={"pk": valid_user.id})
+        api_client_with_token.get(url)
+        with patch("api.views.fan_out_post.delay"):
+            with django_capture_on_commit_callbacks(execute=True):
+                api_client_with_token.post(
+                    reverse("post-list"),
+                    data=post_data.to_dict(exclude=["author"]),
+                    format="json",
+                )
+        response = api_client_with_token.get(url)
+
+        assert response.data["post_count"] == 1
+
+    def test_invalidates_on_commit(
+        self, post, django_capture_on_commit_callbacks
+    ):
+        post_cache.get_or_set(post.id, lambda: {"like_count": 0})
+
+        with django_capture_on_commit_callbacks(execute=True):
+            post_cache.invalidate(post.id)
+            # a rebuild before the commit would read the old row again
+            assert post_cache.get_or_set(post.id, self.fail) == {
+                "like_count": 0
+            }
+
+        assert post_cache.get_or_set(post.id, lambda: {"like_count": 1}) == {
+            "like_count": 1
+        }
+
+    def test_invalidation_during_rebuild_is_kept(
+        self, post, django_capture_on_commit_callbacks
+    ):
+        def build():
+            # a like is committed after the old row was read
+            with django_capture_on_commit_callbacks(execute=True):
+                post_cache.invalidate(post.id)
+            return {"like_count": 0}
+
+        assert post_cache.get_or_set(post.id, build) == {"like_count": 0}
+        assert post_cache.get_or_set(post.id, lambda: {"like_count": 1}) == {
+            "like_count": 1
+        }
+
+    def test_entries_per_origin(
+        self, post, django_capture_on_commit_callbacks
+    ):
+        post_cache.get_or_set(post.id, lambda: "a", origin="http://a/")
+        post_cache.get_or_set(post.id, lambda: "b", origin="http://b/")
+
+        assert post_cache.get_or_set(post.id, self.fail, "http://a/") == "a"
+        assert post_cache.get_or_set(post.id, self.fail, "http://b/") == "b"
+
+        with django_capture_on_commit_callbacks(execute=True):
+            post_cache.invalidate(post.id)
+
+        # every origin's entry is invalidated
+        for origin in ("http://a/", "http://b/"):
+            assert (
+                post_cache.get_or_set(post.id, lambda: "new", origin) == "new"
+            )
+
+    def test_links_of_each_host(self, api_client_with_token, post, settings):
+        settings.ALLOWED_HOSTS = ["one.example", "two.example"]
+        url = reverse("post-detail", kwargs={"pk": post.id})
+        first = api_client_with_token.get(url, HTTP_HOST="one.example")
+        second = api_client_with_token.get(url, HTTP_HOST="two.example")
+
+        assert first.data["author"].startswith("http://one.example/")
+        assert second.data["author"].startswith("http://two.example/")
+
+    def test_redis_down_reads_through(self, redis_server, post):
+        redis_server.connected = False
+
+        data = post_cache.get_or_set(post.id, lambda: {"id": post.id})
+
+        assert data == {"id": post.id}
+
+    def test_versioned_keys(self, settings):
+        settings.DETAIL_CACHE_VERSION = 2
+
+        assert user_cache.key(1, "http://testserver/") == (
+            "detail:v2:user:1:http://testserver/"
+        )
+        assert user_cache.generation_key(1) == "gen:detail:v2:user:1"
+
+
+GENERATION = post_cache.generation_key(1)
+
+
+class TestSingleFlight(object):
+    def fail(self):
+        raise AssertionError("should not rebuild")
+
+    def not_found(self):
+        raise Http404
+
+    def test_stale_entry_served_while_rebuilding(self, redis_client):
+        post_cache._write(post_cache.key(1), GENERATION, {"id": 1})
+        entry = post_cache._read(post_cache.key(1), GENERATION)
+        entry["fresh_until"] = 0
+        redis_client.set(post_cache.key(1), json.dumps(entry))
+        post_cache._lock(post_cache.key(1))
+
+        assert post_cache.get_or_set(1, self.fail) == {"id": 1}
+
+    def test_stale_entry_rebuilt_by_lock_holder(self, redis_client):
+        post_cache._write(post_cache.key(1), GENERATION, {"id": 1})
+        entry = post_cache._read(post_cache.key(1), GENERATION)
+        entry["fresh_until"] = 0
+        redis_client.set(post_cache.key(1), json.dumps(entry))
+
+        assert post_cache.get_or_set(1, lambda: {"id": 2}) == {"id": 2}
+        assert post_cache.get_or_set(1, self.fail) == {"id": 2}
+        assert not redis_client.exists(f"lock:{post_cache.key(1)}")
+
+    def test_miss_waits_for_rebuild(self, redis_client, monkeypatch):
+        key = post_cache.key(1)
+        post_cache._lock(key)
+        # the lock holder finishes while this worker waits
+        monkeypatch.setattr(
+            time,
+            "sleep",
+            lambda _: post_cache._write(key, GENERATION, {"id": 1}),
+        )
+
+        assert post_cache.get_or_set(1, self.fail) == {"id": 1}
+
+    def test_miss_loads_itself_after_waiting(self, settings):
+        settings.DETAIL_CACHE_LOCK_WAIT = 0.05
+        post_cache._lock(post_cache.key(1))
+
+        assert post_cache.get_or_set(1, lambda: {"id": 1}) == {"id": 1}
+
+    def test_lock_released_when_build_fails(self, redis_client):
+        with pytest.raises(Http404):
+            post_cache.get_or_set(1, self.not_found)
+
+        assert not redis_client.exists(f"lock:{post_cache.key(1)}")
+
+
+def subscribed(cache):
+    cache._listen()
+    assert cache.subscribed.wait(1)
+    return cache
+
+
+class TestLocalCache(object):
+    def test_bypassed_until_subscribed(self, redis_server):
+        cache = LocalCache("test", 10, 60)
+        cache.set(1, "one")
+
+        assert cache.get(1) is None
+
+    def test_returns_copies(self):
+        cache = subscribed(LocalCache("test", 10, 60))
+        cache.set(1, {"name": "one"})
+        cache.get(1)["name"] = "two"
+
+        assert cache.get(1) == {"name": "one"}
+
+    def test_expires(self):
+        cache = subscribed(LocalCache("test", 10, 0))
+        cache.set(1, "one")
+
+        assert cache.get(1) is None
+
+    def test_evicts_least_recently_used(self):
+        cache = subscribed(LocalCache("test", 2, 60))
+        cache.set(1, "one")
+        cache.set(2, "two")
+        cache.get(1)
+        cache.set(3, "three")
+
+        assert [cache.get(pk) for pk in (1, 2, 3)] == ["one", None, "three"]
+
+    @pytest.mark.django_db
+    def test_invalidates_every_process(
+        self, django_capture_on_commit_callbacks
+    ):
+        caches = [subscribed(LocalCache("test", 10, 60)) for _ in range(2)]
+        for cache in caches:
+            cache.set(1, "one")
+
+        with django_capture_on_commit_callbacks(execute=True):
+            caches[0].invalidate(1)
+            # the other process waits for the commit
+            assert caches[1].get(1) == "one"
+
+        deadline = time.monotonic() + 1
+        while caches[1].get(1) is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert [cache.get(1) for cache in caches] == [None, None]
+
+
+@pytest.mark.django_db
+class TestCachedJWTAuthentication(object):
+    def test_reuses_user(self, valid_user, django_assert_num_queries):
+        subscribed(auth_user_cache)
+        token = AccessToken.for_user(valid_user)
+        authentication = CachedJWTAuthentication()
+        authentication.get_user(token)
+
+        with django_assert_num_queries(0):
+            user = authentication.get_user(token)
+
+        assert user == valid_user
+
+    def test_deactivated_user_is_refused(self, valid_user):
+        subscribed(auth_user_cache)
+        token = AccessToken.for_user(valid_user)
+        authentication = CachedJWTAuthentication()
+        authentication.get_user(token)
+
+        valid_user.is_active = False
+        valid_user.save()
+
+        with pytest.raises(AuthenticationFailed):
+            authentication.get_user(token)
+
+    def test_bulk_deactivated_user_is_refused(self, valid_user):
+        subscribed(auth_user_cache)
+        token = AccessToken.for_user(valid_user)
+        authentication = CachedJWTAuthentication()
+        authentication.get_user(token)
+
+        User.objects.filter(pk=valid_user.pk).update(is_active=False)
+
+        with pytest.raises(AuthenticationFailed):
+            authentication.get_user(token)
+
+    def test_bulk_deleted_user_is_refused(self, valid_user):
+        subscribed(auth_user_cache)
+        token = AccessToken.for_user(valid_user)
+        authentication = CachedJWTAuthentication()
+        authentication.get_user(token)
+
+        User.objects.filter(pk=valid_user.pk).delete()
+
+        with pytest.raises(AuthenticationFailed):
+            authentication.get_user(token)
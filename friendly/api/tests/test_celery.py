@@ -1,5 +1,21 @@
-from unittest.mock import patch
-from friendly.tasks import set_user_metadata
+import time
+from unittest.mock import call, patch
+
+import fakeredis
+import pytest
+from api import user_metadata
+from api.feed import feed_key
+from api.models import Follow, Post, User
+from django.db import DatabaseError
+from prometheus_client import REGISTRY
+
+from friendly import celery
+from friendly.tasks import (
+    backfill_feed,
+    enrich_users,
+    fan_out_post,
+    set_user_metadata,
+)
 
 
 @patch("friendly.tasks.set_user_metadata.run")
@@ -9,3 +25,207 @@ def test_mock_task(mock_run):
 
     set_user_metadata.run(2, "1.1.1.1")
     assert set_user_metadata.run.call_count == 2
+
+
+@pytest.mark.django_db
+@patch("friendly.tasks.get_holiday_data")
+@patch("friendly.tasks.get_geo_data")
+def test_set_user_metadata(
+    get_geo_data, get_holiday_data, valid_user, django_assert_num_queries
+):
+    get_geo_data.return_value = {"country_code": "KE"}
+    get_holiday_data.return_value = [{"name": "Madaraka Day"}]
+
+    # the user is fetched and updated, without validating it again
+    with django_assert_num_queries(2):
+        set_user_metadata(valid_user.id, "1.1.1.1")
+
+    valid_user.refresh_from_db()
+    assert valid_user.geo_data == {"country_code": "KE"}
+    assert valid_user.created_on_holiday == [{"name": "Madaraka Day"}]
+
+
+@pytest.mark.django_db
+def test_fan_out_post(redis_client, post, valid_user, other_user):
+    Follow.objects.create(follower=other_user, followee=valid_user)
+
+    fan_out_post(post.id)
+
+    for user in (valid_user, other_user):
+        assert redis_client.zrange(feed_key(user.id), 0, -1) == [
+            str(post.id).encode()
+        ]
+
+
+@pytest.mark.django_db
+def test_backfill_feed(redis_client, posts, valid_user, other_user, settings):
+    settings.FEED_MAX_LENGTH = 3
+
+    backfill_feed(other_user.id, valid_user.id)
+
+    assert sorted(
+        int(id) for id in redis_client.zrange(feed_key(other_user.id), 0, -1)
+    ) == [post.id for post in posts[-3:]]
+
+
+@pytest.mark.django_db
+@patch("api.user_metadata.get_holiday_data")
+@patch("api.user_metadata.get_geo_data")
+def test_enrich_users(
+    get_geo_data, get_holiday_data, valid_user, other_user, settings
+):
+    settings.USER_METADATA_BATCH_SIZE = 2
+    geo_data = {"1.1.1.1": {"country_code": "KE"}, "2.2.2.2": None}
+    get_geo_data.side_effect = geo_data.get
+    get_holiday_data.return_value = [{"name": "Madaraka Day"}]
+    user_metadata.enqueue(valid_user.id, "1.1.1.1")
+    user_metadata.enqueue(other_user.id, "1.1.1.1")
+    user_metadata.enqueue(9999999, "1.1.1.1")
+    user_metadata.enqueue(other_user.id, "2.2.2.2")
+
+    assert enrich_users() == 2
+
+    # one lookup per distinct IP and country in each of the two batches
+    assert get_geo_data.call_count == 3
+    assert get_holiday_data.call_args_list == [call("KE")] * 2
+    for user in (valid_user, other_user):
+        user.refresh_from_db()
+        assert user.geo_data == {"country_code": "KE"}
+        assert user.created_on_holiday == [{"name": "Madaraka Day"}]
+    # the failed lookup is tried again on the next run
+    assert user_metadata.take(10) == [[other_user.id, "2.2.2.2", 1]]
+
+
+@pytest.mark.django_db
+@patch("api.user_metadata.get_holiday_data")
+@patch("api.user_metadata.get_geo_data")
+def test_enrich_users_gives_up_on_failed_lookups(
+    get_geo_data, get_holiday_data, valid_user, settings
+):
+    settings.USER_METADATA_MAX_ATTEMPTS = 2
+    get_geo_data.return_value = None
+    user_metadata.enqueue(valid_user.id, "1.1.1.1")
+
+    assert enrich_users() == 0
+    assert user_metadata.pending() == 1
+    assert enrich_users() == 0
+    assert user_metadata.pending() == 0
+    assert get_geo_data.call_count == 2
+
+
+@pytest.mark.django_db
+@patch("api.user_metadata.get_holiday_data")
+@patch("api.user_metadata.get_geo_data")
+def test_enrich_users_keeps_batch_when_update_fails(
+    get_geo_data, get_holiday_data, valid_user, other_user
+):
+    get_geo_data.return_value = {"country_code": "KE"}
+    get_holiday_data.return_value = []
+    user_metadata.enqueue(valid_user.id, "1.1.1.1")
+    user_metadata.enqueue(other_user.id, "2.2.2.2")
+
+    with patch.object(
+        User.objects, "bulk_update", side_effect=DatabaseError
+    ), pytest.raises(DatabaseError):
+        enrich_users()
+
+    assert user_metadata.take(10) == [
+        [valid_user.id, "1.1.1.1"],
+        [other_user.id, "2.2.2.2"],
+    ]
+
+
+def sample_value(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.mark.django_db
+class TestTaskMetrics(object):
+    def test_records_runtime(self, post):
+        labels = {"task": fan_out_post.name, "state": "SUCCESS"}
+        before = sample_value("friendly_task_seconds_count", **labels)
+
+        fan_out_post.apply(args=(post.id,))
+
+        assert (
+            sample_value("friendly_task_seconds_count", **labels) == before + 1
+        )
+
+    def test_records_failures(self):
+        labels = {"task": fan_out_post.name, "exception": "DoesNotExist"}
+        before = sample_value("friendly_task_failures_total", **labels)
+
+        celery.record_failure(
+            sender=fan_out_post, exception=Post.DoesNotExist()
+        )
+
+        assert (
+            sample_value("friendly_task_failures_total", **labels)
+            == before + 1
+        )
+
+    def test_records_retries(self):
+        before = sample_value(
+            "friendly_task_retries_total", task=enrich_users.name
+        )
+
+        celery.record_retry(sender=enrich_users)
+
+        assert (
+            sample_value("friendly_task_retries_total", task=enrich_users.name)
+            == before + 1
+        )
+
+    def test_records_time_in_queue(self):
+        headers = {}
+        celery.stamp_publish_time(headers=headers)
+        headers[celery.PUBLISHED_AT] -= 5
+        before = sample_value(
+            "friendly_task_queue_seconds_sum", task=enrich_users.name
+        )
+
+        enrich_users.push_request(id="queued", **headers)
+        try:
+            celery.record_start(task_id="queued", task=enrich_users)
+        finally:
+            enrich_users.pop_request()
+            celery._started.pop("queued")
+
+        waited = (
+            sample_value(
+                "friendly_task_queue_seconds_sum", task=enrich_users.name
+            )
+            - before
+        )
+        assert 5 <= waited < 6
+
+    def test_time_in_queue_starts_at_eta(self):
+        published = time.time() - 60
+        request = {celery.PUBLISHED_AT: published}
+
+        enrich_users.push_request(eta="2021-08-01T10:00:00+00:00", **request)
+        try:
+            due = celery.due_since(enrich_users.request)
+        finally:
+            enrich_users.pop_request()
+        assert due == published
+
+        enrich_users.push_request(eta="2999-01-01T00:00:00+00:00", **request)
+        try:
+            due = celery.due_since(enrich_users.request)
+        finally:
+            enrich_users.pop_request()
+        assert due > published
+
+
+def test_queue_depth(redis_client):
+    broker = fakeredis.FakeStrictRedis()
+    broker.rpush("celery", "task")
+    user_metadata.enqueue(1, "1.1.1.1")
+    user_metadata.enqueue(2, "2.2.2.2")
+
+    (family,) = celery.QueueDepthCollector(broker).collect()
+
+    assert {
+        sample.labels["queue"]: sample.value for sample in family.samples
+    } == {"celery": 1, user_metadata.QUEUE: 2}
@@ -0,0 +1,157 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+from api.enrichment import CircuitOpenError, EnrichmentClient
+from prometheus_client import REGISTRY
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, self.client_address))
+        status, body, delay = (
+            server.responses.pop(0) if server.responses else (200, {}, 0)
+        )
+        time.sleep(delay)
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    server.daemon_threads = True
+    server.requests = []
+    server.responses = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def stub_client(stub_server, settings):
+    settings.ENRICHMENT_READ_TIMEOUT = 0.2
+    settings.ENRICHMENT_BACKOFF = 0
+    settings.ENRICHMENT_RETRIES = 2
+    settings.ENRICHMENT_BREAKER_THRESHOLD = 3
+    settings.ENRICHMENT_BREAKER_RESET_TIMEOUT = 0.2
+    host, port = stub_server.server_address
+    return EnrichmentClient("stub", f"http://{host}:{port}/v1/")
+
+
+def errors(reason):
+    value = REGISTRY.get_sample_value(
+        "friendly_enrichment_errors_total",
+        {"upstream": "stub", "reason": reason},
+    )
+    return value or 0
+
+
+class TestEnrichmentClient(object):
+    def test_get(self, stub_client, stub_server):
+        stub_server.responses = [(200, {"country_code": "KE"}, 0)]
+
+        assert stub_client.get(ip_address="1.1.1.1") == {"country_code": "KE"}
+        assert stub_server.requests[0][0] == "/v1/?ip_address=1.1.1.1"
+
+    def test_reuses_connections(self, stub_client, stub_server):
+        for _ in range(3):
+            stub_client.get()
+
+        assert len({address for _, address in stub_server.requests}) == 1
+
+    def test_retries_server_errors(self, stub_client, stub_server):
+        stub_server.responses = [(503, {}, 0), (502, {}, 0), (200, [], 0)]
+        before = errors("server_error")
+
+        assert stub_client.get() == []
+        assert len(stub_server.requests) == 3
+        assert errors("server_error") == before + 2
+
+    def test_gives_up_after_retries(self, stub_client, stub_server):
+        stub_server.responses = [(500, {}, 0)] * 3
+
+        with pytest.raises(requests.HTTPError):
+            stub_client.get()
+        assert len(stub_server.requests) == 3
+
+    def test_client_errors_are_not_retried(self, stub_client, stub_server):
+        stub_server.responses = [(401, {}, 0)]
+
+        with pytest.raises(requests.HTTPError):
+            stub_client.get()
+        assert len(stub_server.requests) == 1
+        assert stub_client.breaker.failures == 0
+
+    def test_read_timeout(self, stub_client, stub_server, settings):
+        settings.ENRICHMENT_RETRIES = 0
+        stub_server.responses = [(200, {}, 1)]
+        before = errors("timeout")
+
+        started = time.monotonic()
+        with pytest.raises(requests.Timeout):
+            stub_client.get()
+
+        assert time.monotonic() - started < 1
+        assert errors("timeout") == before + 1
+
+    def test_connection_refused(self, stub_server, settings, caplog):
+        settings.ENRICHMENT_BACKOFF = 0
+        host, port = stub_server.server_address
+        stub_server.server_close()
+        client = EnrichmentClient("stub", f"http://{host}:{port}/")
+
+        with pytest.raises(requests.ConnectionError):
+            client.get(api_key="secret", ip_address="1.1.1.1")
+
+        # the query string is kept out of the logs
+        assert "stub request failed: connection" in caplog.text
+        assert "secret" not in caplog.text
+        assert "1.1.1.1" not in caplog.text
+
+    def test_failure_logs_status(self, stub_client, stub_server, caplog):
+        stub_server.responses = [(401, {}, 0)]
+
+        with pytest.raises(requests.HTTPError):
+            stub_client.get(api_key="secret")
+
+        assert "stub request failed: client_error (status 401)" in caplog.text
+        assert "secret" not in caplog.text
+
+    def test_circuit_breaker(self, stub_client, stub_server, settings):
+        settings.ENRICHMENT_RETRIES = 0
+        stub_server.responses = [(503, {}, 0)] * 3
+        for _ in range(3):
+            with pytest.raises(requests.HTTPError):
+                stub_client.get()
+
+        with pytest.raises(CircuitOpenError):
+            stub_client.get()
+        assert len(stub_server.requests) == 3
+
+        time.sleep(0.2)
+        stub_server.responses = [(503, {}, 0)]
+        with pytest.raises(requests.HTTPError):
+            stub_client.get()
+        with pytest.raises(CircuitOpenError):
+            stub_client.get()
+
+        time.sleep(0.2)
+        assert stub_client.get() == {}
+        assert stub_client.get() == {}
+        assert len(stub_server.requests) == 6
@@ -0,0 +1,96 @@
+from unittest.mock import patch
+
+import pytest
+from api import geoip
+from api.utils import get_geo_data
+from django.core.management import CommandError, call_command
+
+CSV = """network,country_code,city
+1.0.0.0/24,AU,Sydney
+1.0.4.0/22,AU,
+10.0.0.0/8,US,Boston
+2001:db8::/32,DE,Berlin
+"""
+
+
+@pytest.fixture
+def geoip_csv(tmp_path):
+    path = tmp_path / "networks.csv"
+    path.write_text(CSV)
+    return path
+
+
+@pytest.fixture
+def geoip_index(tmp_path, geoip_csv, settings):
+    settings.GEOIP_INDEX_PATH = str(tmp_path / "geoip.idx")
+    call_command("build_geoip_index", str(geoip_csv))
+    return geoip.get_index()
+
+
+class TestGeoIPIndex(object):
+    @pytest.mark.parametrize(
+        "ip,expected",
+        [
+            ("1.0.0.0", {"country_code": "AU", "city": "Sydney"}),
+            ("1.0.0.255", {"country_code": "AU", "city": "Sydney"}),
+            ("1.0.7.1", {"country_code": "AU"}),
+            ("10.20.30.40", {"country_code": "US", "city": "Boston"}),
+            ("2001:db8::1", {"country_code": "DE", "city": "Berlin"}),
+            ("::ffff:10.0.0.1", {"country_code": "US", "city": "Boston"}),
+        ],
+    )
+    def test_lookup(self, geoip_index, ip, expected):
+        assert geoip_index.lookup(ip) == expected
+
+    @pytest.mark.parametrize(
+        "ip", ["0.0.0.1", "1.0.1.0", "11.0.0.0", "2001:db9::", "::1", "x"]
+    )
+    def test_lookup_miss(self, geoip_index, ip):
+        assert geoip_index.lookup(ip) is None
+
+    def test_shares_payloads(self, tmp_path):
+        path = tmp_path / "geoip.idx"
+        data = {"country_code": "AU"}
+        geoip.write_index(path, [("1.0.0.0/24", data), ("2.0.0.0/24", data)])
+
+        assert path.stat().st_size == (
+            geoip.HEADER.size
+            + 2 * geoip.RECORD.size
+            + len(b'{"country_code":"AU"}')
+        )
+
+    def test_overlapping_networks(self, tmp_path):
+        with pytest.raises(ValueError):
+            geoip.write_index(
+                tmp_path / "geoip.idx",
+                [("10.0.0.0/8", {}), ("10.1.0.0/16", {})],
+            )
+
+    def test_reopens_rebuilt_index(self, geoip_index, settings):
+        geoip.write_index(
+            settings.GEOIP_INDEX_PATH, [("1.0.0.0/24", {"country_code": "NZ"})]
+        )
+
+        assert geoip.lookup("1.0.0.1") == {"country_code": "NZ"}
+        assert geoip.lookup("10.0.0.1") is None
+
+    def test_missing_index(self, tmp_path, settings):
+        settings.GEOIP_INDEX_PATH = str(tmp_path / "missing.idx")
+
+        assert geoip.lookup("1.0.0.1") is None
+
+    def test_command_rejects_csv_without_network(self, tmp_path, settings):
+        path = tmp_path / "networks.csv"
+        path.write_text("cidr,country_code\n1.0.0.0/24,AU\n")
+
+        with pytest.raises(CommandError):
+            call_command("build_geoip_index", str(path))
+
+
+@patch("api.utils.geoip_api.get")
+def test_get_geo_data_prefers_index(mock_get, geoip_index):
+    assert get_geo_data("10.0.0.1") == {"country_code": "US", "city": "Boston"}
+    mock_get.assert_not_called()
+
+    get_geo_data("11.0.0.1")
+    mock_get.assert_called_once()
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+from api import hashers
+from django.contrib.auth.hashers import BCryptSHA256PasswordHasher
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.reverse import reverse
+
+
+@pytest.fixture
+def saturated_pool(monkeypatch):
+    hashers.pool._start()
+    monkeypatch.setattr(hashers.pool, "_slots", threading.BoundedSemaphore(1))
+    hashers.pool._slots.acquire()
+
+
+def test_hashes_match_stock_hasher():
+    pooled = hashers.PooledBCryptSHA256PasswordHasher()
+    stock = BCryptSHA256PasswordHasher()
+    salt = pooled.salt()
+
+    assert pooled.encode("secure不", salt) == stock.encode("secure不", salt)
+    assert stock.verify("secure不", pooled.encode("secure不", salt))
+
+
+@pytest.mark.django_db
+class TestSaturatedPool(object):
+    def test_login_is_refused(
+        self, api_client, user_data, valid_user, saturated_pool
+    ):
+        rejected = REGISTRY.get_sample_value(
+            "friendly_password_hashes_rejected_total"
+        )
+        response = api_client.post(
+            reverse("login"),
+            data={
+                "username": user_data.username,
+                "password": user_data.password,
+            },
+            format="json",
+        )
+
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+        assert response["Retry-After"] == "1"
+        assert (
+            REGISTRY.get_sample_value(
+                "friendly_password_hashes_rejected_total"
+            )
+            == rejected + 1
+        )
+
+    def test_signup_is_refused(self, api_client, user_data, saturated_pool):
+        response = api_client.post(
+            reverse("user-list"), data=user_data.to_dict(), format="json"
+        )
+
+        assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+
+
+@pytest.mark.django_db
+def test_refused_past_pool_limit(
+    api_client, user_data, valid_user, settings, monkeypatch
+):
+    settings.PASSWORD_HASHER_POOL_SIZE = 1
+    settings.PASSWORD_HASHER_MAX_PENDING = 1
+    pool = hashers.HashingPool()
+    monkeypatch.setattr(hashers, "pool", pool)
+    pool._start()
+    # one hash running and one queued, as from other worker threads
+    hashes = [
+        threading.Thread(target=pool.run, args=(time.sleep, 1))
+        for _ in range(2)
+    ]
+    for thread in hashes:
+        thread.start()
+    try:
+        deadline = time.monotonic() + 5
+        while pool._slots._value and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        response = api_client.post(
+            reverse("login"),
+            data={
+                "username": user_data.username,
+                "password": user_data.password,
+            },
+            format="json",
+        )
+    finally:
+        for thread in hashes:
+            thread.join()
+        pool._executor.shutdown()
+
+    assert response.status_code == status.HTTP_503_SERVICE_UNAVAILABLE
+    assert response["Retry-After"] == "1"
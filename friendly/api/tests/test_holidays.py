@@ -0,0 +1,84 @@
+import datetime
+from unittest.mock import patch
+
+import pytest
+import requests
+from api import holidays
+
+CHRISTMAS = {
+    "name": "Christmas Day",
+    "country": "GB",
+    "date_year": "2026",
+    "date_month": "12",
+    "date_day": "25",
+}
+
+
+@pytest.fixture(autouse=True)
+def clear_holiday_cache():
+    holidays.get_holidays.cache_clear()
+    yield
+    holidays.get_holidays.cache_clear()
+
+
+@pytest.fixture
+def holiday_api():
+    with patch.object(holidays.holiday_api, "get") as mock_get:
+        mock_get.return_value = [CHRISTMAS]
+        yield mock_get
+
+
+class TestGetHolidays(object):
+    date = datetime.date(2026, 12, 25)
+
+    def test_calls_api_once_per_country_and_date(
+        self, holiday_api, redis_client
+    ):
+        assert holidays.get_holidays("GB", self.date) == [CHRISTMAS]
+        assert holidays.get_holidays("GB", self.date) == [CHRISTMAS]
+
+        holidays.get_holidays.cache_clear()
+        assert holidays.get_holidays("GB", self.date) == [CHRISTMAS]
+
+        assert holiday_api.call_count == 1
+        assert holiday_api.call_args.kwargs["day"] == 25
+
+        holidays.get_holidays("FR", self.date)
+        holidays.get_holidays("GB", self.date + datetime.timedelta(days=1))
+
+        assert holiday_api.call_count == 3
+
+    def test_redis_entry_expires_at_midnight(self, holiday_api, redis_client):
+        holidays.get_holidays("GB", self.date)
+
+        ttl = redis_client.ttl(holidays.holiday_key("GB", self.date))
+        assert 0 < ttl <= 24 * 60 * 60
+
+    def test_errors_are_not_cached(self, holiday_api, redis_client):
+        holiday_api.side_effect = requests.HTTPError
+
+        with pytest.raises(requests.HTTPError):
+            holidays.get_holidays("GB", self.date)
+
+        holiday_api.side_effect = None
+
+        assert holidays.get_holidays("GB", self.date) == [CHRISTMAS]
+
+    def test_preloaded_calendar(self, holiday_api, redis_client):
+        assert holidays.preload("GB", 2026) == 1
+        holiday_api.reset_mock()
+
+        assert holidays.get_holidays("GB", self.date) == [CHRISTMAS]
+        assert holidays.get_holidays("GB", datetime.date(2026, 7, 1)) == []
+        holiday_api.assert_not_called()
+
+    def test_redis_unavailable(self, holiday_api, redis_server):
+        redis_server.connected = False
+
+        assert holidays.get_holidays("GB", self.date) == [CHRISTMAS]
+
+
+def test_get_holiday_data_api_failure(holiday_api):
+    holiday_api.side_effect = requests.ConnectionError
+
+    assert holidays.get_holiday_data("GB") is None
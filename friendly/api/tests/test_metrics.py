@@ -0,0 +1,128 @@
+import asyncio
+import re
+import time
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.db import connection
+from django.http import HttpResponse
+from django.test import AsyncClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import path
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.reverse import reverse
+
+
+def sample_count(name, **labels):
+    return REGISTRY.get_sample_value(f"{name}_count", labels) or 0
+
+
+@pytest.mark.django_db
+class TestRequestMetrics(object):
+    @pytest.fixture(autouse=True)
+    def sample_all(self, settings):
+        settings.REQUEST_METRICS_SAMPLE_RATE = 1
+
+    def test_server_timing(self, api_client_with_token, posts):
+        with CaptureQueriesContext(connection) as captured:
+            response = api_client_with_token.get(reverse("post-list"))
+
+        timing = response["Server-Timing"]
+        queries = re.search(r'db;desc="(\d+) queries";dur=[\d.]+', timing)
+        assert int(queries.group(1)) == len(captured.captured_queries)
+        assert re.search(r"serialize;dur=[\d.]+", timing)
+        assert re.search(r"total;dur=[\d.]+$", timing)
+
+    def test_records_by_url_name(self, api_client_with_token, post):
+        url = reverse("post-detail", kwargs={"pk": post.pk})
+        before = {
+            name: sample_count(name, view="post-detail")
+            for name in (
+                "friendly_request_queries",
+                "friendly_request_sql_seconds",
+                "friendly_request_serialize_seconds",
+            )
+        }
+        requests = sample_count(
+            "friendly_request_seconds", view="post-detail", method="GET"
+        )
+
+        api_client_with_token.get(url)
+
+        for name, count in before.items():
+            assert sample_count(name, view="post-detail") == count + 1
+        assert (
+            sample_count(
+                "friendly_request_seconds", view="post-detail", method="GET"
+            )
+            == requests + 1
+        )
+
+    def test_unmatched(self, api_client):
+        before = sample_count("friendly_request_queries", view="unmatched")
+
+        response = api_client.get("/nowhere/")
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+        assert (
+            sample_count("friendly_request_queries", view="unmatched")
+            == before + 1
+        )
+
+    def test_not_sampled(self, api_client_with_token, post, settings):
+        settings.REQUEST_METRICS_SAMPLE_RATE = 0
+        url = reverse("post-detail", kwargs={"pk": post.pk})
+        before = sample_count("friendly_request_queries", view="post-detail")
+
+        response = api_client_with_token.get(url)
+
+        assert "Server-Timing" not in response
+        assert (
+            sample_count("friendly_request_queries", view="post-detail")
+            == before
+        )
+
+
+async def slow_view(request):
+    await asyncio.sleep(0.3)
+    return HttpResponse()
+
+
+urlpatterns = [path("slow/", slow_view, name="slow")]
+
+
+class TestAsyncRequestMetrics(object):
+    @pytest.fixture(autouse=True)
+    def slow_urls(self, settings):
+        settings.ROOT_URLCONF = __name__
+        settings.REQUEST_METRICS_SAMPLE_RATE = 1
+
+    def test_server_timing(self):
+        before = sample_count("friendly_request_queries", view="slow")
+
+        response = async_to_sync(AsyncClient().get)("/slow/")
+
+        assert re.search(r"total;dur=[\d.]+$", response["Server-Timing"])
+        assert (
+            sample_count("friendly_request_queries", view="slow") == before + 1
+        )
+
+    def test_requests_are_not_serialized(self):
+        async def get_all():
+            client = AsyncClient()
+            return await asyncio.gather(
+                *(client.get("/slow/") for _ in range(4))
+            )
+
+        start = time.monotonic()
+        responses = async_to_sync(get_all)()
+
+        assert all(response.status_code == 200 for response in responses)
+        assert time.monotonic() - start < 0.9
+
+
+def test_metrics_not_served_by_the_api(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == status.HTTP_404_NOT_FOUND
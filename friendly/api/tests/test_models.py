@@ -11,6 +11,7 @@ class TestPostModel(object):
         assert post.content == post_data.content
         assert post.created_when == now
         assert post.likes.count() == 0
+        assert post.like_count == 0
         assert post.author == valid_user
 
     def test_create_one_post_count_ok(self, post_data):
@@ -45,6 +46,13 @@ class TestPostModel(object):
 
         assert "author" and "This field cannot be null" in str(exec_info)
 
+    def test_save_without_validation_still_validates_fields(self, post_data):
+        post = Post(**post_data.to_dict())
+        post.content = ""
+
+        with pytest.raises(ValidationError):
+            post.save(validate=False)
+
 
 @pytest.mark.django_db
 class TestUserModel(object):
@@ -113,5 +121,19 @@ class TestUserModel(object):
 
         assert user.created_on_holiday == {}
 
+    def test_save_without_validation_skips_unique_checks(
+        self, user_data, django_assert_num_queries
+    ):
+        user = User(**user_data.to_dict())
+
+        with django_assert_num_queries(1):
+            user.save(validate=False)
+
+    def test_save_without_validation_still_hits_constraints(
+        self, user_data, valid_user
+    ):
+        with pytest.raises(IntegrityError):
+            User(**user_data.to_dict()).save(validate=False)
+
     def test_can_get_posts_for_author(self, post, valid_user):
         assert valid_user.posts.first().author == valid_user
@@ -0,0 +1,120 @@
+import io
+import uuid
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from unittest.mock import Mock
+
+import pytest
+from api.parsers import ORJSONParser
+from api.renderers import ORJSONRenderer
+from api.serializers import PostDetailSerializer, UserSerializer
+from django.utils.translation import gettext_lazy
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"id": 1, "content": "plain", "like_count": 0, "author": None},
+        {"text": "unicode 不 😶     \x00 \x1f \x7f"},
+        {"floats": [0.1, 36.8155, -1.2841, 1e-4, 1e-05, 1e16, 1.5e300]},
+        {"ints": [2**63 - 1, 2**64, -(2**70)]},
+        {1: "int key", None: "none key", True: "bool key", 0.5: "float"},
+        {"when": datetime(2021, 6, 1, 12, 30, 1, 1500, tzinfo=timezone.utc)},
+        {"when": datetime(2021, 6, 1, tzinfo=timezone(timedelta(hours=3)))},
+        {"when": [datetime(2021, 6, 1), date(2021, 6, 1), time(1, 2, 3)]},
+        {"id": uuid.UUID("12345678-1234-5678-1234-567812345678")},
+        {"price": Decimal("1.10"), "duration": timedelta(seconds=90)},
+        {"lazy": gettext_lazy("This field is required."), "raw": b"bytes"},
+        [[], {}, (1, 2), "", True, False],
+    ],
+)
+def test_renders_like_json_renderer(data):
+    assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        {"score": float("nan")},
+        {"scores": [1.0, float("inf")]},
+        {"nested": {"scores": (float("-inf"),)}},
+    ],
+)
+def test_refuses_non_finite_floats_like_json_renderer(data):
+    with pytest.raises(ValueError) as expected:
+        JSONRenderer().render(data)
+    with pytest.raises(ValueError) as raised:
+        ORJSONRenderer().render(data)
+
+    assert str(raised.value) == str(expected.value)
+
+
+def test_renders_with_orjson(monkeypatch):
+    monkeypatch.setattr(JSONRenderer, "render", Mock(side_effect=TypeError))
+    data = {"when": datetime(2021, 6, 1, tzinfo=timezone.utc), "n": 0.25}
+
+    assert ORJSONRenderer().render(data) == (
+        b'{"when":"2021-06-01T00:00:00Z","n":0.25}'
+    )
+
+
+def test_renders_indented_like_json_renderer():
+    data = {"a": [1, {"b": 2}]}
+    media_type = "application/json; indent=4"
+
+    assert ORJSONRenderer().render(data, media_type) == JSONRenderer().render(
+        data, media_type
+    )
+
+
+def test_renders_none_as_empty():
+    assert ORJSONRenderer().render(None) == b""
+
+
+@pytest.mark.django_db
+def test_renders_serialized_models_like_json_renderer(post, likers):
+    request = APIRequestFactory().get("/")
+    for data in (
+        PostDetailSerializer(post, context={"request": request}).data,
+        UserSerializer(post.author, context={"request": request}).data,
+    ):
+        assert ORJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        b'{"content": "plain", "likes": [{"post": 1, "like": true}]}',
+        '{"text": "unicode 不 😶"}'.encode(),
+        b'{"big": 123456789012345678901234567890, "float": 1e-05}',
+        b'"\\ud800"',
+        b"[]",
+    ],
+)
+def test_parses_like_json_parser(body):
+    assert ORJSONParser().parse(io.BytesIO(body)) == JSONParser().parse(
+        io.BytesIO(body)
+    )
+
+
+def test_parses_other_encodings():
+    body = '{"text": "unicode 不"}'.encode("utf-16")
+    context = {"encoding": "utf-16"}
+
+    assert ORJSONParser().parse(io.BytesIO(body), parser_context=context) == {
+        "text": "unicode 不"
+    }
+
+
+@pytest.mark.parametrize("body", [b'{"a": 1', b'{"a": NaN}', b""])
+def test_parse_errors_match_json_parser(body):
+    with pytest.raises(ParseError) as expected:
+        JSONParser().parse(io.BytesIO(body))
+    with pytest.raises(ParseError) as raised:
+        ORJSONParser().parse(io.BytesIO(body))
+
+    assert str(raised.value) == str(expected.value)
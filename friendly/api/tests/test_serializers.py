@@ -0,0 +1,93 @@
+from unittest.mock import patch
+
+import pytest
+from api.models import Post, User
+from api.serializers import PostSerializer, UserSerializer
+from django.db.models import Count
+from rest_framework.reverse import reverse
+from rest_framework.test import APIRequestFactory
+from rest_framework.utils import model_meta
+
+
+@pytest.fixture
+def context():
+    return {"request": APIRequestFactory().get("/")}
+
+
+def test_fields_are_compiled_once(monkeypatch):
+    monkeypatch.delattr(PostSerializer, "_compiled_fields", raising=False)
+    with patch.object(
+        model_meta, "get_field_info", wraps=model_meta.get_field_info
+    ) as get_field_info:
+        PostSerializer().fields
+        PostSerializer().fields
+
+    assert get_field_info.call_count == 1
+
+
+def test_fields_are_not_shared():
+    first, second = PostSerializer(), PostSerializer()
+
+    assert first.fields["author"] is not second.fields["author"]
+    assert first.fields["author"].parent is first
+    assert second.fields["author"].parent is second
+
+
+@pytest.mark.django_db
+class TestTemplatedLinks(object):
+    def test_links_match_reverse(self, context, post, valid_user):
+        data = PostSerializer(post, context=context).data
+
+        assert data["author"] == reverse(
+            "user-detail", kwargs={"pk": valid_user.pk}, **context
+        )
+
+    def test_reverses_once_per_list(self, context, posts):
+        with patch(
+            "rest_framework.relations.reverse", wraps=reverse
+        ) as reverse_url:
+            data = PostSerializer(posts, many=True, context=context).data
+
+        assert reverse_url.call_count == 1
+        assert len({post["author"] for post in data}) == 1
+
+
+@pytest.mark.django_db
+class TestValues(object):
+    def test_posts_match_instances(self, context, posts):
+        queryset = Post.objects.order_by("id")
+
+        assert (
+            PostSerializer.from_values(
+                PostSerializer.select_values(queryset), context=context
+            ).data
+            == PostSerializer(queryset, many=True, context=context).data
+        )
+
+    def test_users_match_instances(self, context, posts, other_user):
+        queryset = User.objects.annotate(post_count=Count("posts")).order_by(
+            "id"
+        )
+
+        assert (
+            UserSerializer.from_values(
+                UserSerializer.select_values(queryset), context=context
+            ).data
+            == UserSerializer(queryset, many=True, context=context).data
+        )
+
+    def test_selects_only_read_columns(self):
+        queryset = UserSerializer.select_values(
+            User.objects.annotate(post_count=Count("posts"))
+        )
+
+        select, _ = str(queryset.query).split(" FROM ", 1)
+        assert "password" not in select
+        assert set(UserSerializer.get_value_columns()) == {
+            "id",
+            "username",
+            "email",
+            "created_when",
+            "geo_data",
+            "created_on_holiday",
+        }
@@ -0,0 +1,146 @@
+import time
+from datetime import timedelta
+
+import pytest
+import redis
+from api import tokens
+from api.tokens import BloomFilter, RefreshToken, TokenBlacklist
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+
+def listening(blacklist):
+    blacklist._listen()
+    deadline = time.monotonic() + 1
+    while blacklist.bloom is None and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return blacklist
+
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000, 0.01)
+    for i in range(1000):
+        bloom.add(f"member-{i}")
+
+    assert all(f"member-{i}" in bloom for i in range(1000))
+    false_positives = sum(f"other-{i}" in bloom for i in range(10000))
+    assert false_positives < 200
+
+
+@pytest.mark.django_db
+class TestTokenBlacklist(object):
+    def test_falls_back_to_database_until_synced(
+        self, valid_user, redis_client, django_assert_num_queries
+    ):
+        # another process is filling the mirror
+        redis_client.set(tokens.SYNC_LOCK, 1)
+        blacklist = TokenBlacklist()
+        token = RefreshToken.for_user(valid_user)
+        token.blacklist()
+
+        with django_assert_num_queries(1):
+            assert token["jti"] in blacklist
+
+    def test_checks_skip_database_once_synced(
+        self, valid_user, django_assert_num_queries
+    ):
+        blacklisted = RefreshToken.for_user(valid_user)
+        blacklisted.blacklist()
+        valid = RefreshToken.for_user(valid_user)
+        blacklist = TokenBlacklist()
+        blacklist.sync()
+        listening(blacklist)
+
+        with django_assert_num_queries(0):
+            assert blacklisted["jti"] in blacklist
+            assert valid["jti"] not in blacklist
+
+    def test_blacklisting_is_announced(
+        self, valid_user, django_capture_on_commit_callbacks
+    ):
+        blacklist = TokenBlacklist()
+        blacklist.sync()
+        listening(blacklist)
+        token = RefreshToken.for_user(valid_user)
+        # mirrored by the module wide blacklist, heard by every process
+        with django_capture_on_commit_callbacks(execute=True):
+            token.blacklist()
+
+        deadline = time.monotonic() + 1
+        while (
+            token["jti"] not in blacklist.bloom and time.monotonic() < deadline
+        ):
+            time.sleep(0.01)
+        assert token["jti"] in blacklist.bloom
+        assert token["jti"] in blacklist
+
+    def test_mirror_write_failure_reaches_other_processes(
+        self,
+        valid_user,
+        redis_client,
+        monkeypatch,
+        django_capture_on_commit_callbacks,
+    ):
+        blacklist = TokenBlacklist()
+        blacklist.sync()
+        listening(blacklist)
+        token = RefreshToken.for_user(valid_user)
+
+        def fail(*args, **kwargs):
+            raise redis.ConnectionError
+
+        monkeypatch.setattr(redis_client, "zadd", fail)
+        with django_capture_on_commit_callbacks(execute=True):
+            token.blacklist()
+
+        deadline = time.monotonic() + 2
+        while blacklist.bloom is not None and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert blacklist.bloom is None
+        assert token["jti"] in blacklist
+
+    def test_redis_unavailable(self, valid_user, redis_server):
+        blacklist = TokenBlacklist()
+        token = RefreshToken.for_user(valid_user)
+        token.blacklist()
+        blacklist.sync()
+        redis_server.connected = False
+
+        assert token["jti"] in blacklist
+
+
+@pytest.mark.django_db
+def test_purge_expired(valid_user, redis_client, now):
+    for days in (-2, -1, 1):
+        token = RefreshToken.for_user(valid_user)
+        OutstandingToken.objects.filter(jti=token["jti"]).update(
+            expires_at=now + timedelta(days=days)
+        )
+        token.blacklist()
+        redis_client.zadd(
+            tokens.BLACKLIST,
+            {token["jti"]: (now + timedelta(days=days)).timestamp()},
+        )
+
+    assert tokens.purge_expired(batch_size=1) == 2
+
+    assert OutstandingToken.objects.count() == 1
+    assert BlacklistedToken.objects.count() == 1
+    assert redis_client.zcard(tokens.BLACKLIST) == 1
+    assert OutstandingToken.objects.get().expires_at > timezone.now()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_listener_fills_missing_mirror(
+    valid_user, redis_client, django_assert_num_queries
+):
+    token = RefreshToken.for_user(valid_user)
+    token.blacklist()
+    blacklist = listening(TokenBlacklist())
+
+    assert redis_client.exists(tokens.SYNCED)
+    with django_assert_num_queries(0):
+        assert token["jti"] in blacklist
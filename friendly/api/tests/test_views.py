@@ -1,23 +1,72 @@
 import pytest
-from api.models import User
+from api import feed, like_buffer, user_metadata
+from api.models import Follow, Like, Post, User
 from rest_framework import status
 from rest_framework.reverse import reverse
 from rest_framework_simplejwt.tokens import BlacklistedToken, RefreshToken
 
 
 @pytest.mark.django_db
-class TestUserCreateView(object):
-    endpoint = reverse("user-create")
+class TestUserListView(object):
+    endpoint = reverse("user-list")
 
     def test_delete_not_allowed(self, api_client):
         response = api_client.delete(self.endpoint)
 
         assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
 
-    def test_get_not_allowed(self, api_client):
-        response = api_client.get(self.endpoint)
+    def test_get_unauthorized_access(self, api_client, valid_user):
+        response = api_client.get(self.endpoint, {"ids": valid_user.id})
 
-        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_get_many_in_request_order(
+        self,
+        api_client_with_token,
+        valid_user,
+        other_user,
+        post,
+        django_assert_max_num_queries,
+    ):
+        ids = f"{other_user.id},9999999999,{valid_user.id}"
+        with django_assert_max_num_queries(2):
+            response = api_client_with_token.get(self.endpoint, {"ids": ids})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [user["id"] for user in response.data["results"]] == [
+            other_user.id,
+            valid_user.id,
+        ]
+        assert [user["post_count"] for user in response.data["results"]] == [
+            0,
+            1,
+        ]
+        assert response.data["missing"] == [9999999999]
+
+    def test_get_many_fields_skip_post_count(
+        self,
+        api_client_with_token,
+        valid_user,
+        post,
+        django_assert_max_num_queries,
+    ):
+        # one query to authenticate, one for the users
+        with django_assert_max_num_queries(2) as captured:
+            response = api_client_with_token.get(
+                self.endpoint, {"ids": valid_user.id, "fields": "username"}
+            )
+
+        assert response.data["results"] == [{"username": valid_user.username}]
+        assert "COUNT" not in captured.captured_queries[-1]["sql"]
+        assert "geo_data" not in captured.captured_queries[-1]["sql"]
+
+    @pytest.mark.parametrize(
+        "ids", ["", "1,a", ",".join(str(id) for id in range(1, 102))]
+    )
+    def test_get_many_invalid_ids(self, api_client_with_token, ids):
+        response = api_client_with_token.get(self.endpoint, {"ids": ids})
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
 
     def test_put_not_allowed(self, api_client):
         response = api_client.put(self.endpoint)
@@ -36,9 +85,39 @@ class TestUserCreateView(object):
         assert data["email"] == user_data.email
         assert data["geo_data"] == user_data.geo_data
         assert data["username"] == user_data.username
-        assert data["posts"] == []
+        assert data["post_count"] == 0
+        assert data["posts"].endswith(f"/user/{data['id']}/posts/")
         assert "password" not in data
 
+    def test_create_user_checks_uniqueness_once(
+        self, api_client, user_data, django_assert_max_num_queries
+    ):
+        with django_assert_max_num_queries(3) as captured:
+            response = api_client.post(
+                self.endpoint, data=user_data.to_dict(), format="json"
+            )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        selects = [
+            q["sql"] for q in captured.captured_queries if "SELECT" in q["sql"]
+        ]
+        assert len(selects) == 2
+
+    def test_create_user_queues_metadata(
+        self, api_client, user_data, django_capture_on_commit_callbacks
+    ):
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                self.endpoint,
+                data=user_data.to_dict(),
+                format="json",
+                REMOTE_ADDR="10.0.0.1",
+            )
+
+        user = User.objects.get(pk=response.data["id"])
+        assert user.signup_ip == "10.0.0.1"
+        assert user_metadata.take(10) == [[user.id, "10.0.0.1"]]
+
     def test_create_user_with_missing_email(self, api_client, user_data):
         user_data.email = None
         response = api_client.post(
@@ -61,6 +140,34 @@ class TestUserCreateView(object):
             == "user with this email already exists."
         )
 
+    def test_create_user_normalizes_username_and_email(
+        self, api_client, user_data
+    ):
+        user_data.username = "ａｄｍｉｎ"
+        user_data.email = "A@EXAMPLE.COM"
+        response = api_client.post(
+            self.endpoint, data=user_data.to_dict(), format="json"
+        )
+
+        assert response.status_code == status.HTTP_201_CREATED
+        assert response.data["username"] == "admin"
+        assert response.data["email"] == "A@example.com"
+
+    def test_create_user_with_normalized_duplicate_username(
+        self, api_client, user_data, valid_user
+    ):
+        user_data.username = valid_user.username.replace("@", "＠")
+        user_data.email = "another@example.com"
+        response = api_client.post(
+            self.endpoint, data=user_data.to_dict(), format="json"
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert (
+            str(response.data["username"][0])
+            == "User with this Username already exists."
+        )
+
     @pytest.mark.parametrize(
         "invalid_email",
         [
@@ -154,7 +261,7 @@ class TestUserDetailView(object):
         assert data["username"] == user_data.username
         assert data["email"] == user_data.email
         assert data["geo_data"] == user_data.geo_data
-        assert len(data["posts"]) == 0
+        assert data["post_count"] == 0
 
     def test_get_user_details_with_posts(
         self, api_client_with_token, valid_user, user_data, post
@@ -165,8 +272,28 @@ class TestUserDetailView(object):
         data = response.data
 
         assert response.status_code == status.HTTP_200_OK
-        assert len(data["posts"]) == 1
-        assert int(data["posts"][0].split("/")[-2]) == post.id
+        assert data["post_count"] == 1
+        assert data["posts"] == (
+            "http://testserver"
+            + reverse("user-posts", kwargs={"pk": valid_user.id})
+        )
+
+    def test_get_user_fields(self, api_client_with_token, valid_user):
+        url = reverse("user-detail", kwargs={"pk": valid_user.id})
+        response = api_client_with_token.get(f"{url}?fields=id,username")
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            "id": valid_user.id,
+            "username": valid_user.username,
+        }
+
+    def test_get_user_unknown_fields(self, api_client_with_token, valid_user):
+        url = reverse("user-detail", kwargs={"pk": valid_user.id})
+        response = api_client_with_token.get(f"{url}?fields=id,password")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+        assert response.data["fields"] == "Unknown fields: password."
 
     def test_get_user_not_existing(self, api_client_with_token):
         url = reverse("user-detail", kwargs={"pk": 9999999999})
@@ -175,6 +302,43 @@ class TestUserDetailView(object):
         assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
+@pytest.mark.django_db
+class TestUserPostsView(object):
+    def test_unauthorized_access(self, api_client, valid_user):
+        url = reverse("user-posts", kwargs={"pk": valid_user.id})
+        response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_user_not_existing(self, api_client_with_token):
+        url = reverse("user-posts", kwargs={"pk": 9999999999})
+        response = api_client_with_token.get(url)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_user_without_posts(self, api_client_with_token, valid_user):
+        url = reverse("user-posts", kwargs={"pk": valid_user.id})
+        response = api_client_with_token.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"next": None, "results": []}
+
+    def test_walk_all_pages_newest_first(
+        self, api_client_with_token, valid_user, posts
+    ):
+        url = reverse("user-posts", kwargs={"pk": valid_user.id})
+        url = f"{url}?page_size=4"
+        seen = []
+        while url:
+            response = api_client_with_token.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.data["results"]) <= 4
+            seen.extend(post["id"] for post in response.data["results"])
+            url = response.data["next"]
+
+        assert seen == [post.id for post in reversed(posts)]
+
+
 @pytest.mark.django_db
 class TestPostDetailView(object):
     def test_unauthorized_access(self, api_client, valid_user):
@@ -212,7 +376,102 @@ class TestPostDetailView(object):
         assert response.status_code == status.HTTP_200_OK
         assert data["content"] == post_data.content
         assert int(data["author"].split("/")[-2]) == valid_user.id
-        assert len(data["likes"]) == 0
+        assert data["like_count"] == 0
+        assert data["likes"] == {"next": None, "results": []}
+
+    def test_post_detail_fields(self, api_client_with_token, post):
+        url = reverse("post-detail", kwargs={"pk": post.id})
+        response = api_client_with_token.get(f"{url}?fields=id,content")
+
+        assert response.data == {"id": post.id, "content": post.content}
+
+    def test_post_detail_expand_author(
+        self,
+        api_client_with_token,
+        post,
+        valid_user,
+        django_assert_max_num_queries,
+    ):
+        url = reverse("post-detail", kwargs={"pk": post.id})
+        with django_assert_max_num_queries(2) as captured:
+            response = api_client_with_token.get(
+                f"{url}?fields=id,content&expand=author"
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {
+            "id": post.id,
+            "content": post.content,
+            "author": {
+                "id": valid_user.id,
+                "username": valid_user.username,
+                "created_when": response.data["author"]["created_when"],
+                "posts": "http://testserver"
+                + reverse("user-posts", kwargs={"pk": valid_user.id}),
+            },
+        }
+        assert "JOIN" in captured.captured_queries[-1]["sql"]
+        assert '"like_count"' not in captured.captured_queries[-1]["sql"]
+
+    def test_post_detail_expand_unknown(self, api_client_with_token, post):
+        url = reverse("post-detail", kwargs={"pk": post.id})
+        response = api_client_with_token.get(f"{url}?expand=likes")
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_post_detail_carries_first_page_of_likes(
+        self, api_client_with_token, post, likers
+    ):
+        url = reverse("post-detail", kwargs={"pk": post.id})
+        response = api_client_with_token.get(url)
+
+        likes = response.data["likes"]
+
+        assert response.data["like_count"] == len(likers)
+        assert len(likes["results"]) == 5
+        assert likes["results"][0]["user"] == likers[-1].id
+        assert "/likes/" in likes["next"]
+
+
+@pytest.mark.django_db
+class TestPostLikesView(object):
+    def test_unauthorized_access(self, api_client, post):
+        url = reverse("post-likes", kwargs={"pk": post.id})
+        response = api_client.get(url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_post_not_existing(self, api_client_with_token):
+        url = reverse("post-likes", kwargs={"pk": 9999999999})
+        response = api_client_with_token.get(url)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_no_likes(self, api_client_with_token, post):
+        url = reverse("post-likes", kwargs={"pk": post.id})
+        response = api_client_with_token.get(url)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"next": None, "results": []}
+
+    def test_walk_all_pages_newest_first(
+        self, api_client_with_token, post, likers
+    ):
+        url = reverse("post-likes", kwargs={"pk": post.id})
+        seen = []
+        while url:
+            response = api_client_with_token.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            seen.extend(like["user"] for like in response.data["results"])
+            url = response.data["next"]
+
+        assert seen == [user.id for user in reversed(likers)]
+
+    def test_invalid_cursor(self, api_client_with_token, post):
+        url = reverse("post-likes", kwargs={"pk": post.id})
+        response = api_client_with_token.get(url, {"cursor": "garbage"})
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
 @pytest.mark.django_db
@@ -251,8 +510,12 @@ class TestLikesView(object):
         )
 
         data = response.data
+        post.refresh_from_db()
 
-        assert len(data["likes"]) == likes_count_before + 1
+        assert response.status_code == status.HTTP_200_OK
+        assert data["liked"] is True
+        assert data["like_count"] == likes_count_before + 1
+        assert post.like_count == post.likes.count() == data["like_count"]
 
     def test_user_likes_then_unlikes_a_post_resets_count(
         self, api_client_with_token, post, post_data
@@ -267,26 +530,372 @@ class TestLikesView(object):
         )
 
         data = response.data
+        post.refresh_from_db()
+
+        assert data["liked"] is False
+        assert data["like_count"] == likes_count_before
+        assert post.like_count == post.likes.count() == data["like_count"]
+
+    def test_like_response_does_not_list_likers(
+        self, api_client_with_token, post
+    ):
+        url = reverse("likes", kwargs={"pk": post.id})
+        response = api_client_with_token.put(url)
+
+        assert set(response.data) == {"id", "like_count", "liked"}
+
+    def test_like_post_not_existing(self, api_client_with_token):
+        url = reverse("likes", kwargs={"pk": 9999999999})
+        response = api_client_with_token.put(url)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+    def test_write_behind_reads_own_writes(
+        self, api_client_with_token, post, settings
+    ):
+        settings.LIKES_WRITE_BEHIND = True
+        url = reverse("likes", kwargs={"pk": post.id})
+
+        liked = api_client_with_token.put(url).data
+        post.refresh_from_db()
+
+        assert liked == {"id": post.id, "like_count": 1, "liked": True}
+        assert post.like_count == post.likes.count() == 0
+
+        unliked = api_client_with_token.put(url).data
+
+        assert unliked == {"id": post.id, "like_count": 0, "liked": False}
+
+    def test_write_behind_flush(
+        self, api_client_with_token, redis_client, post, settings
+    ):
+        settings.LIKES_WRITE_BEHIND = True
+        url = reverse("likes", kwargs={"pk": post.id})
+        api_client_with_token.put(url)
+
+        assert like_buffer.flush() == 1
+        post.refresh_from_db()
+
+        assert post.like_count == post.likes.count() == 1
+        assert not redis_client.exists(like_buffer.PENDING)
+        assert not redis_client.exists(like_buffer.DELTA)
+
+        response = api_client_with_token.put(url)
+        like_buffer.flush()
+        post.refresh_from_db()
+
+        assert response.data["like_count"] == 0
+        assert post.like_count == post.likes.count() == 0
+
+    def test_write_behind_flush_keeps_taken_over_lock(
+        self, api_client_with_token, redis_client, post, settings, monkeypatch
+    ):
+        settings.LIKES_WRITE_BEHIND = True
+        api_client_with_token.put(reverse("likes", kwargs={"pk": post.id}))
+        apply = Like.objects.apply
+
+        def outlive_lock(intents):
+            # the lock expires and the next flush takes it
+            redis_client.set(like_buffer.FLUSH_LOCK, "next")
+            return apply(intents)
+
+        monkeypatch.setattr(Like.objects, "apply", outlive_lock)
+
+        assert like_buffer.flush() == 1
+        assert redis_client.get(like_buffer.FLUSH_LOCK) == b"next"
+
+    def test_write_behind_toggle_races_other_toggle(
+        self, redis_client, valid_user, post
+    ):
+        raced = []
+
+        def stored():
+            # the same user's other toggle lands while this one reads
+            if not raced:
+                raced.append(like_buffer.toggle(valid_user.id, post.id))
+            return False
+
+        delta, liked = like_buffer._buffer(
+            redis_client, valid_user.id, post.id, None, stored
+        )
+
+        assert raced == [(1, True)]
+        assert (delta, liked) == (0, False)
+        assert int(redis_client.hget(like_buffer.DELTA, post.id)) == 0
 
-        assert len(data["likes"]) == likes_count_before
+    def test_write_behind_post_not_existing(
+        self, api_client_with_token, settings
+    ):
+        settings.LIKES_WRITE_BEHIND = True
+        url = reverse("likes", kwargs={"pk": 9999999999})
+        response = api_client_with_token.put(url)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
 
 
 @pytest.mark.django_db
-class TestPostCreateView(object):
-    endpoint = reverse("post-create")
+class TestLikesBatchView(object):
+    endpoint = reverse("likes-batch")
 
     def test_unauthorized_access(self, api_client):
         response = api_client.post(self.endpoint)
 
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
-    def test_delete_not_allowed(self, api_client_with_token):
-        response = api_client_with_token.delete(self.endpoint)
+    def test_get_not_allowed(self, api_client_with_token):
+        response = api_client_with_token.get(self.endpoint)
 
         assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
 
-    def test_get_not_allowed(self, api_client_with_token):
-        response = api_client_with_token.get(self.endpoint)
+    def test_empty_batch(self, api_client_with_token):
+        response = api_client_with_token.post(
+            self.endpoint, data={"likes": []}, format="json"
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_batch_too_large(self, api_client_with_token):
+        likes = [{"post": i, "like": True} for i in range(1, 102)]
+        response = api_client_with_token.post(
+            self.endpoint, data={"likes": likes}, format="json"
+        )
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_like_and_unlike_in_one_batch(
+        self,
+        api_client_with_token,
+        valid_user,
+        posts,
+        django_assert_max_num_queries,
+    ):
+        Like.objects.create(post=posts[1], user=valid_user)
+        Post.objects.filter(pk=posts[1].pk).update(like_count=1)
+        likes = [
+            {"post": posts[0].id, "like": True},
+            {"post": posts[1].id, "like": False},
+            {"post": posts[2].id, "like": False},
+            {"post": 9999999999, "like": True},
+        ]
+        # auth, lock, existing likes, insert, delete, counters, savepoints
+        with django_assert_max_num_queries(8):
+            response = api_client_with_token.post(
+                self.endpoint, data={"likes": likes}, format="json"
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"] == [
+            {"id": posts[0].id, "like_count": 1, "liked": True},
+            {"id": posts[1].id, "like_count": 0, "liked": False},
+            {"id": posts[2].id, "like_count": 0, "liked": False},
+            {"id": 9999999999, "detail": "Not found."},
+        ]
+        assert list(valid_user.likes.all()) == [posts[0]]
+        assert [
+            Post.objects.get(pk=post.pk).like_count for post in posts[:3]
+        ] == [1, 0, 0]
+
+    def test_write_behind_batch_overrides_toggle(
+        self, api_client_with_token, redis_client, post, settings
+    ):
+        settings.LIKES_WRITE_BEHIND = True
+        api_client_with_token.put(reverse("likes", kwargs={"pk": post.id}))
+
+        response = api_client_with_token.post(
+            self.endpoint,
+            data={"likes": [{"post": post.id, "like": False}]},
+            format="json",
+        )
+        like_buffer.flush()
+        post.refresh_from_db()
+
+        assert response.data["results"] == [
+            {"id": post.id, "like_count": 0, "liked": False}
+        ]
+        assert post.like_count == post.likes.count() == 0
+        assert not redis_client.exists(like_buffer.DELTA)
+
+    def test_replayed_likes_are_idempotent(
+        self, api_client_with_token, valid_user, post
+    ):
+        likes = [{"post": post.id, "like": True}]
+        for _ in range(2):
+            response = api_client_with_token.post(
+                self.endpoint, data={"likes": likes}, format="json"
+            )
+        post.refresh_from_db()
+
+        assert response.data["results"][0]["like_count"] == 1
+        assert post.like_count == post.likes.count() == 1
+
+
+@pytest.mark.django_db
+class TestFollowView(object):
+    def test_unauthorized_access(self, api_client, other_user):
+        url = reverse("follow", kwargs={"pk": other_user.id})
+        response = api_client.put(url)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_get_not_allowed(self, api_client_with_token, other_user):
+        url = reverse("follow", kwargs={"pk": other_user.id})
+        response = api_client_with_token.get(url)
+
+        assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
+
+    def test_follow_then_unfollow(
+        self, api_client_with_token, valid_user, other_user
+    ):
+        url = reverse("follow", kwargs={"pk": other_user.id})
+        response = api_client_with_token.put(url)
+        other_user.refresh_from_db()
+
+        assert response.data["following"] is True
+        assert response.data["follower_count"] == 1
+        assert other_user.follower_count == 1
+        assert list(valid_user.following.all()) == [other_user]
+
+        response = api_client_with_token.put(url)
+        other_user.refresh_from_db()
+
+        assert response.data["following"] is False
+        assert response.data["follower_count"] == 0
+        assert other_user.follower_count == 0
+        assert valid_user.following.count() == 0
+
+    def test_cannot_follow_self(self, api_client_with_token, valid_user):
+        url = reverse("follow", kwargs={"pk": valid_user.id})
+        response = api_client_with_token.put(url)
+
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
+
+    def test_follow_user_not_existing(self, api_client_with_token):
+        url = reverse("follow", kwargs={"pk": 9999999999})
+        response = api_client_with_token.put(url)
+
+        assert response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+class TestFeedView(object):
+    endpoint = reverse("feed")
+
+    @pytest.fixture
+    def follows(self, valid_user, other_user):
+        Follow.objects.create(follower=other_user, followee=valid_user)
+        User.objects.filter(pk=valid_user.pk).update(follower_count=1)
+
+    def walk(self, client, url):
+        seen = []
+        while url:
+            response = client.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            seen.extend(post["id"] for post in response.data["results"])
+            url = response.data["next"]
+        return seen
+
+    def test_unauthorized_access(self, api_client):
+        response = api_client.get(self.endpoint)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_empty_feed(self, other_client_with_token):
+        response = other_client_with_token.get(self.endpoint)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"next": None, "results": []}
+
+    def test_fanned_out_posts(
+        self, other_client_with_token, other_user, follows, posts
+    ):
+        for post in Post.objects.select_related("author"):
+            feed.fan_out(post)
+
+        seen = self.walk(other_client_with_token, self.endpoint)
+
+        assert seen == [post.id for post in reversed(posts)]
+
+    def test_popular_author_fanned_out_on_read(
+        self,
+        settings,
+        redis_client,
+        other_client_with_token,
+        other_user,
+        follows,
+        posts,
+    ):
+        settings.FEED_FANOUT_THRESHOLD = 1
+        for post in Post.objects.select_related("author"):
+            feed.fan_out(post)
+
+        seen = self.walk(other_client_with_token, self.endpoint)
+
+        assert not redis_client.exists(feed.feed_key(other_user.id))
+        assert seen == [post.id for post in reversed(posts)]
+
+    def test_feed_fields(
+        self,
+        other_client_with_token,
+        other_user,
+        follows,
+        posts,
+        django_assert_max_num_queries,
+    ):
+        for post in Post.objects.select_related("author"):
+            feed.fan_out(post)
+
+        with django_assert_max_num_queries(3) as captured:
+            response = other_client_with_token.get(
+                f"{self.endpoint}?fields=id,content"
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"][0] == {
+            "id": posts[-1].id,
+            "content": posts[-1].content,
+        }
+        assert '"like_count"' not in captured.captured_queries[-1]["sql"]
+        # the cursor columns are selected all the same
+        seen = self.walk(other_client_with_token, response.data["next"])
+        assert seen == [post.id for post in reversed(posts)][5:]
+
+    def test_feed_expand_author(
+        self, other_client_with_token, valid_user, follows, posts
+    ):
+        for post in Post.objects.select_related("author"):
+            feed.fan_out(post)
+
+        response = other_client_with_token.get(
+            f"{self.endpoint}?expand=author"
+        )
+
+        assert response.status_code == status.HTTP_200_OK
+        for post in response.data["results"]:
+            assert post["author"]["username"] == valid_user.username
+
+    def test_unfollowed_author_dropped(
+        self, other_client_with_token, other_user, follows, posts
+    ):
+        for post in Post.objects.select_related("author"):
+            feed.fan_out(post)
+        Follow.objects.all().delete()
+
+        seen = self.walk(other_client_with_token, self.endpoint)
+
+        assert seen == []
+
+
+@pytest.mark.django_db
+class TestPostListView(object):
+    endpoint = reverse("post-list")
+
+    def test_unauthorized_access(self, api_client):
+        response = api_client.post(self.endpoint)
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+    def test_delete_not_allowed(self, api_client_with_token):
+        response = api_client_with_token.delete(self.endpoint)
 
         assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
 
@@ -295,6 +904,101 @@ class TestPostCreateView(object):
 
         assert response.status_code == status.HTTP_405_METHOD_NOT_ALLOWED
 
+    def test_list_without_posts(self, api_client_with_token):
+        response = api_client_with_token.get(self.endpoint)
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data == {"next": None, "results": []}
+
+    def test_list_walk_all_pages_newest_first(
+        self, api_client_with_token, posts, other_user
+    ):
+        latest = Post.objects.create(
+            content="latest",
+            created_when=posts[-1].created_when,
+            author=other_user,
+        )
+        url = self.endpoint
+        seen = []
+        while url:
+            response = api_client_with_token.get(url)
+            assert response.status_code == status.HTTP_200_OK
+            assert len(response.data["results"]) <= 5
+            seen.extend(post["id"] for post in response.data["results"])
+            url = response.data["next"]
+
+        assert seen == [latest.id] + [post.id for post in reversed(posts)]
+
+    def test_list_fields(
+        self, api_client_with_token, posts, django_assert_max_num_queries
+    ):
+        with django_assert_max_num_queries(2) as captured:
+            response = api_client_with_token.get(
+                f"{self.endpoint}?fields=id,content"
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert response.data["results"][0] == {
+            "id": posts[-1].id,
+            "content": posts[-1].content,
+        }
+        assert '"like_count"' not in captured.captured_queries[-1]["sql"]
+        # the cursor columns are selected all the same
+        response = api_client_with_token.get(response.data["next"])
+        assert len(response.data["results"]) == 5
+
+    def test_list_expand_author(
+        self,
+        api_client_with_token,
+        posts,
+        valid_user,
+        django_assert_max_num_queries,
+    ):
+        with django_assert_max_num_queries(2):
+            response = api_client_with_token.get(
+                f"{self.endpoint}?expand=author"
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        for post in response.data["results"]:
+            assert post["author"]["username"] == valid_user.username
+            assert set(post) == {
+                "id",
+                "content",
+                "author",
+                "created_when",
+                "like_count",
+            }
+
+    def test_get_many_in_request_order(
+        self,
+        api_client_with_token,
+        posts,
+        django_assert_max_num_queries,
+    ):
+        ids = f"{posts[3].id},9999999999,{posts[0].id},{posts[3].id}"
+        with django_assert_max_num_queries(2):
+            response = api_client_with_token.get(self.endpoint, {"ids": ids})
+
+        assert response.status_code == status.HTTP_200_OK
+        assert [post["id"] for post in response.data["results"]] == [
+            posts[3].id,
+            posts[0].id,
+        ]
+        assert response.data["missing"] == [9999999999]
+
+    def test_list_does_not_count_rows(
+        self, api_client_with_token, posts, django_assert_max_num_queries
+    ):
+        url = f"{self.endpoint}?page_size=2"
+        response = api_client_with_token.get(url)
+        with django_assert_max_num_queries(2) as captured:
+            response = api_client_with_token.get(response.data["next"])
+
+        assert len(response.data["results"]) == 2
+        assert not any("COUNT" in q["sql"] for q in captured.captured_queries)
+        assert not any("OFFSET" in q["sql"] for q in captured.captured_queries)
+
     def test_create_post_with_valid_data(
         self, api_client_with_token, post_data, valid_user
     ):
@@ -385,6 +1089,30 @@ class TestLoginView(object):
         assert response.status_code == status.HTTP_401_UNAUTHORIZED
 
 
+@pytest.mark.django_db
+class TestRefreshView(object):
+    endpoint = reverse("refresh")
+
+    def test_refresh_rotates_token(
+        self, api_client, valid_user, django_capture_on_commit_callbacks
+    ):
+        refresh = str(RefreshToken.for_user(valid_user))
+        with django_capture_on_commit_callbacks(execute=True):
+            response = api_client.post(
+                self.endpoint, data={"refresh": refresh}, format="json"
+            )
+
+        assert response.status_code == status.HTTP_200_OK
+        assert set(response.data) == {"access", "refresh"}
+        assert response.data["refresh"] != refresh
+
+        response = api_client.post(
+            self.endpoint, data={"refresh": refresh}, format="json"
+        )
+
+        assert response.status_code == status.HTTP_401_UNAUTHORIZED
+
+
 @pytest.mark.django_db
 class TestLogoutView(object):
     endpoint = reverse("logout")
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import math
+import os
+import threading
+import time
+
+import redis
+from api.utils import get_redis
+from django.conf import settings
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import tokens
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import (
+    BlacklistedToken,
+    OutstandingToken,
+)
+
+logger = logging.getLogger(__name__)
+
+# Blacklisted jtis scored by expiry, and the channel new ones are announced
+# on. SYNCED is set once the set mirrors the BlacklistedToken table, and
+# SYNC_LOCK is held by the process filling it.
+BLACKLIST = "tokens:blacklist"
+SYNCED = "tokens:blacklist:synced"
+SYNC_LOCK = "lock:tokens:blacklist:sync"
+CHANNEL = "tokens:blacklisted"
+
+
+class BloomFilter(object):
+    """
+    Set membership with no false negatives and about ``error_rate`` false
+    positives while it holds at most ``capacity`` items.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.capacity = max(capacity, 1)
+        self.size = math.ceil(
+            -self.capacity * math.log(error_rate) / math.log(2) ** 2
+        )
+        self.hashes = max(round(self.size / self.capacity * math.log(2)), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "big")
+        b = int.from_bytes(digest[8:], "big") | 1
+        return ((a + i * b) % self.size for i in range(self.hashes))
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(
+            self.bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(item)
+        )
+
+
+class TokenBlacklist(object):
+    """
+    Blacklisted refresh tokens, checked without querying the database.
+
+    Blacklisted jtis are mirrored into a Redis sorted set. Each process
+    keeps a Bloom filter of them, kept current through Redis pub/sub, so
+    that most checks, for tokens that are not blacklisted, never leave the
+    process. A jti the filter may contain is looked up in Redis, and in
+    the database if the mirror is unavailable. A mirror that is missing,
+    after a deploy or a Redis restart, is filled by the first process to
+    notice.
+    """
+
+    def __init__(self):
+        self.bloom = None
+        self.lock = threading.Lock()
+        self._pid = None
+
+    def __contains__(self, jti):
+        self._listen()
+        bloom = self.bloom
+        if bloom is not None and jti not in bloom:
+            return False
+        try:
+            pipe = get_redis().pipeline(transaction=False)
+            pipe.exists(SYNCED)
+            pipe.zscore(BLACKLIST, jti)
+            synced, score = pipe.execute()
+            if synced:
+                return score is not None
+        except redis.RedisError:
+            logger.warning("Could not check the blacklist", exc_info=True)
+        return BlacklistedToken.objects.filter(token__jti=jti).exists()
+
+    def add(self, jti, exp):
+        r = get_redis()
+        try:
+            r.zadd(BLACKLIST, {jti: exp})
+            r.publish(CHANNEL, json.dumps([jti]))
+        except redis.RedisError:
+            logger.error("Could not mirror %s", jti, exc_info=True)
+            # without the mirror the database has the final say, until the
+            # next sync
+            try:
+                r.delete(SYNCED)
+            except redis.RedisError:
+                pass
+
+    def sync(self):
+        """
+        Mirror the unexpired blacklisted tokens into Redis
+
+        :return: number of tokens mirrored
+        """
+
+        r = get_redis()
+        jtis = BlacklistedToken.objects.filter(
+            token__expires_at__gt=timezone.now()
+        ).values_list("token__jti", "token__expires_at")
+        # entries are only ever added, so there is nothing to clear first
+        count = 0
+        pipe = r.pipeline(transaction=False)
+        for jti, expires_at in jtis.iterator():
+            pipe.zadd(BLACKLIST, {jti: expires_at.timestamp()})
+            count += 1
+            if count % 1000 == 0:
+                pipe.execute()
+        pipe.set(SYNCED, 1)
+        pipe.execute()
+        r.publish(CHANNEL, json.dumps([]))
+        return count
+
+    def _listen(self):
+        # one listener per process; a forked child starts its own
+        if self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self.bloom = None
+            threading.Thread(
+                target=self._run, name="token-blacklist", daemon=True
+            ).start()
+
+    def _run(self):
+        while True:
+            try:
+                pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                self._rebuild()
+                rebuilt = time.monotonic()
+                while True:
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        jtis = json.loads(message["data"])
+                        if not jtis:
+                            # the mirror was synced from the database
+                            self._rebuild()
+                        elif self.bloom is not None:
+                            for jti in jtis:
+                                self.bloom.add(jti)
+                    if self.bloom is not None and not get_redis().exists(
+                        SYNCED
+                    ):
+                        # a jti could not be mirrored, and may be missing
+                        # from the filter: the database has the final say
+                        self.bloom = None
+                    bloom = self.bloom
+                    elapsed = time.monotonic() - rebuilt
+                    if (
+                        (bloom is not None and bloom.count > bloom.capacity)
+                        or elapsed > settings.TOKEN_BLOOM_REBUILD_INTERVAL
+                        or (
+                            bloom is None
+                            and elapsed > settings.TOKEN_SYNC_TIMEOUT
+                        )
+                    ):
+                        self._rebuild()
+                        rebuilt = time.monotonic()
+            except redis.RedisError:
+                logger.warning("Lost blacklist updates", exc_info=True)
+            self.bloom = None
+            time.sleep(1)
+
+    def _rebuild(self):
+        # built after subscribing, so no jti announced meanwhile is missed;
+        # expired ones are left out
+        r = get_redis()
+        if not r.exists(SYNCED):
+            self.bloom = None
+            self._sync()
+            return
+        jtis = r.zrangebyscore(BLACKLIST, time.time(), "+inf")
+        bloom = BloomFilter(
+            max(2 * len(jtis), settings.TOKEN_BLOOM_CAPACITY),
+            settings.TOKEN_BLOOM_ERROR_RATE,
+        )
+        for jti in jtis:
+            bloom.add(jti.decode())
+        self.bloom = bloom
+
+    def _sync(self):
+        # one process fills the mirror, and every process rebuilds its
+        # filter once it announces it is done
+        if not get_redis().set(
+            SYNC_LOCK, 1, nx=True, ex=settings.TOKEN_SYNC_TIMEOUT
+        ):
+            return
+        try:
+            self.sync()
+        except DatabaseError:
+            logger.warning("Could not sync the blacklist", exc_info=True)
+        finally:
+            # the listener thread's own connection
+            connection.close()
+
+
+token_blacklist = TokenBlacklist()
+
+
+class RefreshToken(tokens.RefreshToken):
+    def check_blacklist(self):
+        if self.payload[api_settings.JTI_CLAIM] in token_blacklist:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        result = super().blacklist()
+        jti = self.payload[api_settings.JTI_CLAIM]
+        exp = self.payload["exp"]
+        transaction.on_commit(lambda: token_blacklist.add(jti, exp))
+        return result
+
+
+def purge_expired(batch_size):
+    """
+    Delete expired outstanding and blacklisted tokens
+
+    Tokens are walked in id order, which is also roughly expiry order, in
+    short transactions of ``batch_size`` tokens, stopping at the first
+    batch with nothing expired.
+
+    :return: number of outstanding tokens deleted
+    """
+
+    now = timezone.now()
+    outstanding = OutstandingToken.objects.order_by("id").values_list(
+        "id", "expires_at"
+    )
+    deleted = 0
+    last_id = 0
+    while True:
+        chunk = list(outstanding.filter(id__gt=last_id)[:batch_size])
+        expired = [id for id, expires_at in chunk if expires_at <= now]
+        if not expired:
+            break
+        with transaction.atomic():
+            BlacklistedToken.objects.filter(token_id__in=expired).delete()
+            OutstandingToken.objects.filter(id__in=expired).delete()
+        deleted += len(expired)
+        last_id = chunk[-1][0]
+
+    try:
+        get_redis().zremrangebyscore(BLACKLIST, "-inf", now.timestamp())
+    except redis.RedisError:
+        logger.warning("Could not trim the blacklist mirror", exc_info=True)
+    return deleted
@@ -0,0 +1,113 @@
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from api.cache import user_cache
+from api.holidays import get_holiday_data
+from api.models import User
+from api.utils import get_geo_data, get_redis
+from django.conf import settings
+
+# Signups waiting for their geo and holiday data, as JSON [user_id, ip],
+# followed by the number of failed attempts once one failed.
+QUEUE = "users:metadata"
+
+
+def enqueue(user_id, ip):
+    """
+    Queue a signup for enrichment
+
+    :return: number of signups queued
+    """
+
+    return get_redis().rpush(QUEUE, json.dumps([user_id, ip]))
+
+
+def pending():
+    return get_redis().llen(QUEUE)
+
+
+def requeue(entries):
+    if entries:
+        get_redis().rpush(QUEUE, *(json.dumps(entry) for entry in entries))
+
+
+def take(count):
+    pipe = get_redis().pipeline()
+    pipe.lrange(QUEUE, 0, count - 1)
+    pipe.ltrim(QUEUE, count, -1)
+    entries, _ = pipe.execute()
+    return [json.loads(entry) for entry in entries]
+
+
+def resolve(lookup, keys):
+    with ThreadPoolExecutor(settings.USER_METADATA_CONCURRENCY) as pool:
+        return dict(zip(keys, pool.map(lookup, keys)))
+
+
+def enrich(entries):
+    """
+    Set the geo and holiday data of a batch of signups
+
+    Each distinct IP and country is looked up once, the lookups run
+    concurrently and the users are written with a single bulk update.
+    Signups whose lookups failed are queued again, until they have been
+    tried ``USER_METADATA_MAX_ATTEMPTS`` times, and the whole batch is if
+    the update fails.
+
+    :param entries: entries taken from the queue
+    :return: number of users updated
+    """
+
+    try:
+        updated, failed = _enrich(entries)
+    except Exception:
+        requeue(entries)
+        raise
+    requeue(
+        [
+            [user_id, ip, attempts + 1]
+            for user_id, ip, attempts in failed
+            if attempts + 1 < settings.USER_METADATA_MAX_ATTEMPTS
+        ]
+    )
+    return updated
+
+
+def _enrich(entries):
+    # the last entry of a user wins, as when they are written one by one
+    ips = {entry[0]: entry[1] for entry in entries}
+    attempts = {
+        entry[0]: entry[2] if len(entry) > 2 else 0 for entry in entries
+    }
+    geo_data = resolve(get_geo_data, list(set(ips.values())))
+    countries = {
+        data["country_code"]
+        for data in geo_data.values()
+        if data and data.get("country_code")
+    }
+    holidays = resolve(get_holiday_data, list(countries))
+
+    users = User.objects.filter(pk__in=ips).only("id", "created_on_holiday")
+    updated = []
+    failed = []
+    for user in users:
+        data = geo_data[ips[user.id]]
+        if not data:
+            failed.append((user.id, ips[user.id], attempts[user.id]))
+            continue
+        user.geo_data = data
+        country_code = data.get("country_code")
+        holiday_data = holidays.get(country_code)
+        if holiday_data is not None:
+            user.created_on_holiday = holiday_data
+        elif country_code:
+            failed.append((user.id, ips[user.id], attempts[user.id]))
+        updated.append(user)
+
+    User.objects.bulk_update(
+        updated,
+        ["geo_data", "created_on_holiday"],
+        batch_size=settings.USER_METADATA_BATCH_SIZE,
+    )
+    user_cache.invalidate(*(user.id for user in updated))
+    return len(updated), failed
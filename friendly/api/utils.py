@@ -1,8 +1,13 @@
-import datetime
-import json
+import ipaddress
 import os
 
+import redis
 import requests
+from api import geoip
+from api.enrichment import geoip_api
+from django.conf import settings
+
+_redis = None
 
 
 def remote_address(request):
@@ -25,18 +30,40 @@ def remote_address(request):
     return ip
 
 
+def parse_ip(value):
+    """
+    Normalise an IP address
+
+    :param value: IP as given by remote_address
+    :return: the IP, or None if it is not a valid address
+    """
+
+    try:
+        return str(ipaddress.ip_address(value.strip()))
+    except (AttributeError, ValueError):
+        return None
+
+
 def get_geo_data(ip):
-    api_key = os.environ.get("ABSTRACT_GEOIP_KEY")
-    url = f"https://ipgeolocation.abstractapi.com/v1/?api_key={api_key}&ip_address={ip}"
-    response = requests.get(url)
-    if response.ok:
-        return json.loads(response.content)
-
-
-def get_holiday_data(country_code):
-    api_key = os.environ.get("ABSTRACT_HOLIDAY_KEY")
-    now = datetime.now()
-    url = f"https://holidays.abstractapi.com/v1/?api_key={api_key}&country={country_code}&year={now.year}&month={now.month}&day={now.day}"
-    response = requests.get(url)
-    if response.ok:
-        return json.loads(response.content)
+    geo_data = geoip.lookup(ip)
+    if geo_data is not None:
+        return geo_data
+    try:
+        return geoip_api.get(
+            api_key=os.environ.get("ABSTRACT_GEOIP_KEY"), ip_address=ip
+        )
+    except requests.RequestException:
+        return None
+
+
+def get_redis():
+    """
+    Get the process wide Redis client
+
+    :return: redis.Redis
+    """
+
+    global _redis
+    if _redis is None:
+        _redis = redis.Redis.from_url(settings.REDIS_URL)
+    return _redis
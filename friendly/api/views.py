@@ -1,70 +1,296 @@
-from api.models import Post, User
-from api.serializers import PostSerializer, UserSerializer
-from api.utils import remote_address
+from api import like_buffer, user_metadata
+from api.cache import post_cache, user_cache
+from api.feed import FeedPagination
+from api.models import Follow, Like, Post, User
+from api.pagination import KeysetPagination
+from api.serializers import (
+    LikeBatchSerializer,
+    LikeSerializer,
+    PostDetailSerializer,
+    PostSerializer,
+    UserSerializer,
+)
+from api.tokens import RefreshToken
+from api.utils import parse_ip, remote_address
+from django.db import transaction
 from django.http import Http404
+from django.conf import settings
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from friendly.tasks import set_user_metadata
+from friendly.tasks import backfill_feed, enrich_users, fan_out_post
 
 
-class UserCreateView(APIView):
-    permission_classes = (AllowAny,)
+class SparseFieldsMixin(object):
+    fields_query_param = "fields"
+    expand_query_param = "expand"
+
+    def _get_names(self, request, param, allowed):
+        value = request.query_params.get(param, "")
+        names = [
+            name
+            for name in dict.fromkeys(
+                name.strip() for name in value.split(",")
+            )
+            if name
+        ]
+        unknown = [name for name in names if name not in allowed]
+        if unknown:
+            raise ValidationError(
+                {param: f"Unknown fields: {', '.join(unknown)}."}
+            )
+        return names
+
+    def get_field_options(self, request, serializer_class):
+        """
+        Fields to serialize and relations to expand, as asked for
+
+        :return: ``fields`` and ``expand`` keyword arguments for
+            ``serializer_class``; ``fields`` is ``None`` for all of them
+        """
+
+        readable = [
+            name
+            for name, field in serializer_class().fields.items()
+            if not field.write_only
+        ]
+        expandable = getattr(serializer_class.Meta, "expandable_fields", {})
+        fields = self._get_names(request, self.fields_query_param, readable)
+        expand = self._get_names(request, self.expand_query_param, expandable)
+        if not fields:
+            fields = None
+        else:
+            fields += [name for name in expand if name not in fields]
+        return {"fields": fields, "expand": expand}
+
+    def get_sparse_queryset(
+        self, queryset, serializer_class, options, columns=()
+    ):
+        # expanded relations need instances, anything else reads values
+        columns = [
+            *(name.lstrip("-") for name in KeysetPagination.ordering),
+            *columns,
+        ]
+        if options["expand"]:
+            return serializer_class.prune(queryset, columns=columns, **options)
+        return serializer_class.select_values(
+            queryset, options["fields"], columns
+        )
+
+    def get_sparse_serializer(self, rows, serializer_class, options):
+        context = {"request": self.request}
+        if options["expand"]:
+            return serializer_class(
+                rows, many=True, context=context, **options
+            )
+        return serializer_class.from_values(
+            rows, fields=options["fields"], context=context
+        )
+
+    def filter_fields(self, data, options):
+        if options["fields"] is None:
+            return data
+        return {
+            name: value
+            for name, value in data.items()
+            if name in options["fields"]
+        }
+
+
+class MultiGetMixin(SparseFieldsMixin):
+    ids_query_param = "ids"
+
+    def _get_ids(self, request):
+        value = request.query_params.get(self.ids_query_param, "")
+        try:
+            ids = [int(id) for id in value.split(",") if id.strip()]
+        except ValueError:
+            raise ValidationError(
+                {self.ids_query_param: "Expected comma separated ids."}
+            )
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            raise ValidationError({self.ids_query_param: "No ids given."})
+        if len(ids) > settings.MULTI_GET_MAX_SIZE:
+            raise ValidationError(
+                {
+                    self.ids_query_param: "At most "
+                    f"{settings.MULTI_GET_MAX_SIZE} ids may be requested."
+                }
+            )
+        return ids
+
+    def multi_get(self, request, queryset, serializer_class):
+        ids = self._get_ids(request)
+        options = self.get_field_options(request, serializer_class)
+        objects = {}
+        for row in self.get_sparse_queryset(
+            queryset.filter(id__in=ids), serializer_class, options
+        ):
+            objects[row["id"] if isinstance(row, dict) else row.id] = row
+        serializer = self.get_sparse_serializer(
+            [objects[id] for id in ids if id in objects],
+            serializer_class,
+            options,
+        )
+        return Response(
+            {
+                "results": serializer.data,
+                "missing": [id for id in ids if id not in objects],
+            }
+        )
+
+
+class UserListView(MultiGetMixin, APIView):
+    def get_permissions(self):
+        # anyone may sign up, only users may look others up
+        if self.request.method == "GET":
+            return [IsAuthenticated()]
+        return [AllowAny()]
+
+    def get(self, request):
+        return self.multi_get(request, User.objects.all(), UserSerializer)
 
     def post(self, request):
-        serializer = UserSerializer(data=request.data)
+        serializer = UserSerializer(
+            data=request.data, context={"request": request}
+        )
         if serializer.is_valid(raise_exception=True):
-            serializer.save()
             ip = remote_address(request)
-            set_user_metadata.delay(serializer.data["id"], ip)
+            user = serializer.save(signup_ip=parse_ip(ip))
+            transaction.on_commit(lambda: self.enqueue_metadata(user.id, ip))
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def enqueue_metadata(self, user_id, ip):
+        queued = user_metadata.enqueue(user_id, ip)
+        if queued % settings.USER_METADATA_BATCH_SIZE == 0:
+            enrich_users.delay()
+
 
-class UserDetailView(APIView):
+class UserDetailView(SparseFieldsMixin, APIView):
     permission_classes = (IsAuthenticated,)
 
     def _get_object(self, pk):
         try:
-            return User.objects.get(pk=pk)
+            return UserSerializer.prune(User.objects.all()).get(pk=pk)
         except User.DoesNotExist:
             raise Http404
 
     def get(self, request, pk):
-        user = self._get_object(pk)
-        serializer = UserSerializer(user, context={"request": request})
-        return Response(serializer.data)
+        options = self.get_field_options(request, UserSerializer)
+
+        def build():
+            user = self._get_object(pk)
+            return UserSerializer(user, context={"request": request}).data
+
+        # the whole payload is cached, and cut down to the fields asked for
+        data = user_cache.get_or_set(
+            pk, build, origin=request.build_absolute_uri("/")
+        )
+        return Response(self.filter_fields(data, options))
+
+
+class UserPostsView(SparseFieldsMixin, APIView):
+    permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+
+    def get(self, request, pk):
+        options = self.get_field_options(request, PostSerializer)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(
+            self.get_sparse_queryset(
+                Post.objects.filter(author_id=pk), PostSerializer, options
+            ),
+            request,
+            view=self,
+        )
+        if not page and not User.objects.filter(pk=pk).exists():
+            raise Http404
+        serializer = self.get_sparse_serializer(page, PostSerializer, options)
+        return paginator.get_paginated_response(serializer.data)
 
 
-class PostCreateView(APIView):
+class PostListView(MultiGetMixin, APIView):
     permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+
+    def get(self, request):
+        if self.ids_query_param in request.query_params:
+            return self.multi_get(request, Post.objects.all(), PostSerializer)
+        options = self.get_field_options(request, PostSerializer)
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(
+            self.get_sparse_queryset(
+                Post.objects.all(), PostSerializer, options
+            ),
+            request,
+            view=self,
+        )
+        serializer = self.get_sparse_serializer(page, PostSerializer, options)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request):
         serializer = PostSerializer(
             data=request.data, context={"request": request}
         )
         if serializer.is_valid():
-            serializer.save(author=request.user)
+            post = serializer.save(author=request.user)
+            transaction.on_commit(lambda: fan_out_post.delay(post.id))
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class PostDetailView(APIView):
+class PostDetailView(SparseFieldsMixin, APIView):
     permission_classes = (IsAuthenticated,)
 
-    def _get_object(self, pk):
+    def _get_object(self, pk, **options):
+        queryset = PostDetailSerializer.prune(Post.objects.all(), **options)
         try:
-            return Post.objects.get(pk=pk)
+            return queryset.get(pk=pk)
         except Post.DoesNotExist:
             raise Http404
 
     def get(self, request, pk):
-        user = self._get_object(pk)
-        serializer = PostSerializer(user, context={"request": request})
-        return Response(serializer.data)
+        options = self.get_field_options(request, PostDetailSerializer)
+        if options["expand"]:
+            # expanded payloads are not cached
+            post = self._get_object(pk, **options)
+            return Response(
+                PostDetailSerializer(
+                    post, context={"request": request}, **options
+                ).data
+            )
+
+        def build():
+            post = self._get_object(pk)
+            return PostDetailSerializer(
+                post, context={"request": request}
+            ).data
+
+        # the whole payload is cached, and cut down to the fields asked for
+        data = post_cache.get_or_set(
+            pk, build, origin=request.build_absolute_uri("/")
+        )
+        return Response(self.filter_fields(data, options))
+
+
+class PostLikesView(APIView):
+    permission_classes = (IsAuthenticated,)
+    pagination_class = KeysetPagination
+
+    def get(self, request, pk):
+        paginator = self.pagination_class()
+        page = paginator.paginate_queryset(
+            Like.objects.filter(post_id=pk), request, view=self
+        )
+        if not page and not Post.objects.filter(pk=pk).exists():
+            raise Http404
+        serializer = LikeSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class LikesView(APIView):
@@ -72,19 +298,131 @@ class LikesView(APIView):
 
     def _get_object(self, pk):
         try:
-            return Post.objects.get(pk=pk)
+            return (
+                Post.objects.select_for_update().only("like_count").get(pk=pk)
+            )
         except Post.DoesNotExist:
             raise Http404
 
     def put(self, request, pk):
-        post = self._get_object(pk)
         user = request.user
-        if post.likes.filter(id=user.id).exists():
-            post.likes.remove(user)
-        else:
-            post.likes.add(user)
-        serializer = PostSerializer(post, context={"request": request})
-        return Response(serializer.data)
+        if settings.LIKES_WRITE_BEHIND:
+            like_count, liked = like_buffer.toggle(user.id, pk)
+            return Response(
+                {"id": pk, "like_count": like_count, "liked": liked}
+            )
+        likes = Like.objects
+        with transaction.atomic():
+            # the row lock serializes toggles on this post, so the counter
+            # can be computed here instead of being read back
+            post = self._get_object(pk)
+            deleted, _ = likes.filter(
+                post_id=post.id, user_id=user.id
+            ).delete()
+            liked = not deleted
+            if liked:
+                likes.create(post_id=post.id, user_id=user.id)
+            post.like_count += 1 if liked else -1
+            Post.objects.filter(pk=post.pk).update(like_count=post.like_count)
+        post_cache.invalidate(post.pk)
+        return Response(
+            {"id": post.id, "like_count": post.like_count, "liked": liked}
+        )
+
+
+class LikesBatchView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def post(self, request):
+        serializer = LikeBatchSerializer(data=request.data)
+        if serializer.is_valid():
+            # a later intent for the same post overrides an earlier one
+            intents = {
+                (request.user.id, item["post"]): item["like"]
+                for item in serializer.validated_data["likes"]
+            }
+            if settings.LIKES_WRITE_BEHIND:
+                like_counts = like_buffer.apply(intents)
+            else:
+                like_counts = Like.objects.apply(intents)
+            results = []
+            for (_, post_id), like in intents.items():
+                if post_id in like_counts:
+                    results.append(
+                        {
+                            "id": post_id,
+                            "like_count": like_counts[post_id],
+                            "liked": like,
+                        }
+                    )
+                else:
+                    results.append({"id": post_id, "detail": "Not found."})
+            return Response({"results": results})
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class FollowView(APIView):
+    permission_classes = (IsAuthenticated,)
+
+    def _get_object(self, pk):
+        try:
+            return (
+                User.objects.select_for_update()
+                .only("follower_count")
+                .get(pk=pk)
+            )
+        except User.DoesNotExist:
+            raise Http404
+
+    def put(self, request, pk):
+        user = request.user
+        if user.id == pk:
+            return Response(
+                {"detail": "You cannot follow yourself."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        with transaction.atomic():
+            followee = self._get_object(pk)
+            deleted, _ = Follow.objects.filter(
+                follower_id=user.id, followee_id=followee.id
+            ).delete()
+            following = not deleted
+            if following:
+                Follow.objects.create(
+                    follower_id=user.id, followee_id=followee.id
+                )
+                transaction.on_commit(
+                    lambda: backfill_feed.delay(user.id, followee.id)
+                )
+            followee.follower_count += 1 if following else -1
+            User.objects.filter(pk=followee.pk).update(
+                follower_count=followee.follower_count
+            )
+        return Response(
+            {
+                "id": followee.id,
+                "follower_count": followee.follower_count,
+                "following": following,
+            }
+        )
+
+
+class FeedView(SparseFieldsMixin, APIView):
+    permission_classes = (IsAuthenticated,)
+    pagination_class = FeedPagination
+
+    def get(self, request):
+        options = self.get_field_options(request, PostSerializer)
+        paginator = self.pagination_class()
+        page = paginator.paginate_feed(
+            self.get_sparse_queryset(
+                Post.objects.all(), PostSerializer, options, ["author_id"]
+            ),
+            request.user,
+            request,
+        )
+        serializer = self.get_sparse_serializer(page, PostSerializer, options)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class LogoutView(APIView):
@@ -1,8 +1,176 @@
+import logging
 import os
+import time
+from datetime import datetime
 
-from celery import Celery
+import redis
+from celery import Celery, signals
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "friendly.settings")
+
 app = Celery("friendly")
 app.config_from_object("django.conf:settings", namespace="CELERY")
 app.autodiscover_tasks()
+
+logger = logging.getLogger(__name__)
+
+TASK_SECONDS = Histogram(
+    "friendly_task_seconds",
+    "Time to run a task, by final state",
+    ["task", "state"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+)
+TASK_QUEUE_SECONDS = Histogram(
+    "friendly_task_queue_seconds",
+    "Time a task waited in the queue, from when it was due to its start",
+    ["task"],
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600),
+)
+TASK_RETRIES = Counter("friendly_task_retries_total", "Task retries", ["task"])
+TASK_FAILURES = Counter(
+    "friendly_task_failures_total",
+    "Failed tasks by exception",
+    ["task", "exception"],
+)
+
+# the header tasks are stamped with when published
+PUBLISHED_AT = "published_at"
+
+# start times of the tasks running in this process, by task id
+_started = {}
+
+
+@signals.before_task_publish.connect
+def stamp_publish_time(headers=None, **kwargs):
+    if headers is not None:
+        headers[PUBLISHED_AT] = time.time()
+
+
+def due_since(request):
+    """
+    When a task was due: when it was published or, if delayed by a
+    countdown or a retry, when that ran out
+
+    :return: float timestamp or None if it was not published by us
+    """
+
+    published = request.get(PUBLISHED_AT)
+    if published is None:
+        return None
+    eta = request.eta
+    if isinstance(eta, str):
+        eta = datetime.fromisoformat(eta)
+    if eta is not None:
+        published = max(published, eta.timestamp())
+    return published
+
+
+@signals.task_prerun.connect
+def record_start(task_id=None, task=None, **kwargs):
+    _started[task_id] = time.monotonic()
+    due = due_since(task.request)
+    if due is not None:
+        TASK_QUEUE_SECONDS.labels(task.name).observe(max(time.time() - due, 0))
+
+
+@signals.task_postrun.connect
+def record_runtime(task_id=None, task=None, state=None, **kwargs):
+    start = _started.pop(task_id, None)
+    if start is not None:
+        TASK_SECONDS.labels(task.name, state).observe(time.monotonic() - start)
+
+
+@signals.task_retry.connect
+def record_retry(sender=None, **kwargs):
+    TASK_RETRIES.labels(sender.name).inc()
+
+
+@signals.task_failure.connect
+def record_failure(sender=None, exception=None, **kwargs):
+    TASK_FAILURES.labels(sender.name, type(exception).__name__).inc()
+
+
+class QueueDepthCollector(object):
+    """
+    Lengths of the Redis lists tasks and signups to enrich wait in, read
+    when scraped so that they are current whatever the worker is doing
+    """
+
+    def __init__(self, broker=None):
+        self.broker = broker
+
+    def queues(self):
+        from api import user_metadata
+        from api.utils import get_redis
+
+        if self.broker is not None:
+            for name in app.amqp.queues:
+                yield name, self.broker
+        yield user_metadata.QUEUE, get_redis()
+
+    def describe(self):
+        yield self.family()
+
+    def collect(self):
+        family = self.family()
+        for name, client in self.queues():
+            try:
+                family.add_metric([name], client.llen(name))
+            except redis.RedisError:
+                logger.warning("Could not read the length of %s", name)
+        yield family
+
+    def family(self):
+        return GaugeMetricFamily(
+            "friendly_queue_depth",
+            "Entries waiting in a Redis queue",
+            labels=["queue"],
+        )
+
+
+def clear_multiprocess_dir(path):
+    # metrics of the processes of a previous run must not be added up
+    os.makedirs(path, exist_ok=True)
+    pid = str(os.getpid())
+    for name in os.listdir(path):
+        if os.path.splitext(name)[0].rsplit("_", 1)[-1] != pid:
+            os.remove(os.path.join(path, name))
+
+
+@signals.worker_init.connect
+def start_metrics_server(sender=None, **kwargs):
+    """
+    Serve the metrics of the worker, and of its pool processes when
+    ``PROMETHEUS_MULTIPROC_DIR`` is set, from its main process
+    """
+
+    from django.conf import settings
+
+    if not settings.WORKER_METRICS_PORT:
+        return
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        clear_multiprocess_dir(os.environ["PROMETHEUS_MULTIPROC_DIR"])
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    broker = None
+    if app.conf.broker_url.startswith(("redis://", "rediss://")):
+        broker = redis.Redis.from_url(app.conf.broker_url)
+    registry.register(QueueDepthCollector(broker))
+    start_http_server(settings.WORKER_METRICS_PORT, registry=registry)
+
+
+@signals.worker_process_shutdown.connect
+def mark_process_dead(pid=None, **kwargs):
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(pid or os.getpid())
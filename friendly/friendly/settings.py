@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.metrics.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -56,6 +57,12 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "friendly.urls"
 
+# Share of the requests whose queries and timings are recorded; 0 turns the
+# instrumentation off
+REQUEST_METRICS_SAMPLE_RATE = float(
+    os.environ.get("REQUEST_METRICS_SAMPLE_RATE", default=0.1)
+)
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -73,6 +80,10 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = "friendly.wsgi.application"
+ASGI_APPLICATION = "friendly.asgi.application"
+# Serve the API from async views; only worth it when running under ASGI,
+# e.g. with uvicorn workers.
+ASYNC_VIEWS = int(os.environ.get("ASYNC_VIEWS", default=0))
 
 
 # Database
@@ -137,20 +148,27 @@ STATIC_URL = "/static/"
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 PASSWORD_HASHERS = [
-    "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
+    "api.hashers.PooledBCryptSHA256PasswordHasher",
 ]
+# Hashes run in a pool of this many processes per worker, with up to
+# PASSWORD_HASHER_MAX_PENDING more queued; the rest get a 503.
+PASSWORD_HASHER_POOL_SIZE = int(
+    os.environ.get("PASSWORD_HASHER_POOL_SIZE", default=2)
+)
+PASSWORD_HASHER_MAX_PENDING = 8
+PASSWORD_HASHER_RETRY_AFTER = 1
 
 REST_FRAMEWORK = {
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.KeysetPagination",
     "PAGE_SIZE": 5,
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
         "rest_framework.permissions.AllowAny",
     ),
-    "DEFAULT_RENDERER_CLASSES": ("rest_framework.renderers.JSONRenderer",),
-    "DEFAULT_PARSER_CLASSES": ("rest_framework.parsers.JSONParser",),
+    "DEFAULT_RENDERER_CLASSES": ("api.renderers.ORJSONRenderer",),
+    "DEFAULT_PARSER_CLASSES": ("api.parsers.ORJSONParser",),
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_VERSIONING_CLASS": "rest_framework.versioning.NamespaceVersioning",
 }
@@ -185,3 +203,97 @@ CELERY_RESULT_BACKEND = os.environ.get("CELERY_BROKER", "redis://redis:6379/0")
 CELERY_IMPORTS = [
     "friendly.tasks",
 ]
+# Port the worker serves its Prometheus metrics on; 0 to not serve them.
+WORKER_METRICS_PORT = int(os.environ.get("WORKER_METRICS_PORT", default=9540))
+
+REDIS_URL = os.environ.get("REDIS_URL", "redis://redis:6379/1")
+
+# Calls to the geolocation and holiday APIs; timeouts are in seconds.
+ENRICHMENT_CONNECT_TIMEOUT = 3.05
+ENRICHMENT_READ_TIMEOUT = 5
+ENRICHMENT_RETRIES = 2
+ENRICHMENT_BACKOFF = 0.2
+ENRICHMENT_POOL_SIZE = 10
+ENRICHMENT_BREAKER_THRESHOLD = 5
+ENRICHMENT_BREAKER_RESET_TIMEOUT = 30
+
+# Built by `manage.py build_geoip_index`; without it every lookup goes to
+# the remote geolocation API.
+GEOIP_INDEX_PATH = os.environ.get(
+    "GEOIP_INDEX_PATH", os.path.join(BASE_DIR, "geoip.idx")
+)
+
+# Bump DETAIL_CACHE_VERSION whenever a cached payload changes shape.
+DETAIL_CACHE_VERSION = 1
+DETAIL_CACHE_TIMEOUT = int(os.environ.get("DETAIL_CACHE_TIMEOUT", 300))
+DETAIL_CACHE_STALE_TIMEOUT = 60
+# Seconds a rebuild may hold its lock, and that workers missing the cache
+# wait for it before loading the object themselves.
+DETAIL_CACHE_LOCK_TIMEOUT = 5
+DETAIL_CACHE_LOCK_WAIT = 0.5
+
+# Users authenticated by access token are cached in each process for up to
+# AUTH_USER_CACHE_TIMEOUT seconds.
+AUTH_USER_CACHE_SIZE = 10000
+AUTH_USER_CACHE_TIMEOUT = 60
+
+# Refresh token blacklist checks go through a per-process Bloom filter
+# rebuilt every TOKEN_BLOOM_REBUILD_INTERVAL seconds; expired tokens are
+# purged in batches of TOKEN_PURGE_BATCH_SIZE every TOKEN_PURGE_INTERVAL.
+# A process that finds the Redis mirror missing fills it from the database,
+# and others retry every TOKEN_SYNC_TIMEOUT seconds should that fail.
+TOKEN_BLOOM_CAPACITY = 100000
+TOKEN_BLOOM_ERROR_RATE = 0.01
+TOKEN_BLOOM_REBUILD_INTERVAL = 60 * 60
+TOKEN_PURGE_BATCH_SIZE = 1000
+TOKEN_PURGE_INTERVAL = 60 * 60
+TOKEN_SYNC_TIMEOUT = 60
+
+# Authors with at least this many followers are not fanned out on write;
+# their posts are merged into followers' feeds when the feed is read.
+FEED_FANOUT_THRESHOLD = int(os.environ.get("FEED_FANOUT_THRESHOLD", 10000))
+FEED_MAX_LENGTH = 800
+
+LIKES_BATCH_MAX_SIZE = 100
+# Buffer like toggles in Redis and let flush_like_buffer write them to the
+# database every LIKES_FLUSH_INTERVAL seconds.
+LIKES_WRITE_BEHIND = int(os.environ.get("LIKES_WRITE_BEHIND", default=0))
+LIKES_FLUSH_INTERVAL = 2.0
+LIKES_FLUSH_BATCH_SIZE = 1000
+LIKES_FLUSH_TIMEOUT = 60
+
+# Signups are enriched with geo and holiday data in batches of up to
+# USER_METADATA_BATCH_SIZE, at least every USER_METADATA_BATCH_INTERVAL
+# seconds. Signups whose lookups failed are tried again on the next runs,
+# up to USER_METADATA_MAX_ATTEMPTS times in all.
+USER_METADATA_BATCH_SIZE = 500
+USER_METADATA_BATCH_INTERVAL = 2.0
+USER_METADATA_CONCURRENCY = 16
+USER_METADATA_MAX_ATTEMPTS = 5
+
+# Countries whose holiday calendar for the year is loaded into Redis once a
+# day, so signups from them never wait on the holiday API.
+HOLIDAY_PRELOAD_COUNTRIES = list(
+    filter(None, os.environ.get("HOLIDAY_PRELOAD_COUNTRIES", "").split(","))
+)
+
+CELERY_BEAT_SCHEDULE = {
+    "flush-like-buffer": {
+        "task": "friendly.tasks.flush_like_buffer",
+        "schedule": LIKES_FLUSH_INTERVAL,
+    },
+    "enrich-users": {
+        "task": "friendly.tasks.enrich_users",
+        "schedule": USER_METADATA_BATCH_INTERVAL,
+    },
+    "purge-expired-tokens": {
+        "task": "friendly.tasks.purge_expired_tokens",
+        "schedule": TOKEN_PURGE_INTERVAL,
+    },
+    "preload-holiday-calendars": {
+        "task": "friendly.tasks.preload_holiday_calendars",
+        "schedule": 24 * 60 * 60,
+    },
+}
+
+MULTI_GET_MAX_SIZE = 100
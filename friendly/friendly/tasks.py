@@ -3,8 +3,13 @@ import os
 from datetime import datetime
 
 import requests
-from api.models import User
+from api import feed, holidays, like_buffer, tokens, user_metadata
+from api.holidays import get_holiday_data
+from api.models import Post, User
 from api.serializers import UserSerializer
+from api.utils import get_geo_data
+from django.conf import settings
+from django.utils import timezone
 
 from friendly import celery_app
 
@@ -23,3 +28,62 @@ def set_user_metadata(user_id, ip):
         )
         if serializer.is_valid():
             serializer.save()
+
+
+@celery_app.task
+def enrich_users():
+    """
+    Enrich queued signups in batches of ``USER_METADATA_BATCH_SIZE``
+
+    Runs on a beat every ``USER_METADATA_BATCH_INTERVAL`` seconds, and
+    early whenever a full batch has been queued. Only the signups queued
+    when it starts are taken, so those queued again after a failed lookup
+    wait for the next run.
+    """
+
+    enriched = 0
+    remaining = user_metadata.pending()
+    while remaining > 0:
+        entries = user_metadata.take(
+            min(remaining, settings.USER_METADATA_BATCH_SIZE)
+        )
+        if not entries:
+            break
+        remaining -= len(entries)
+        enriched += user_metadata.enrich(entries)
+    return enriched
+
+
+@celery_app.task
+def fan_out_post(post_id):
+    post = Post.objects.select_related("author").get(pk=post_id)
+    feed.fan_out(post)
+
+
+@celery_app.task
+def backfill_feed(follower_id, followee_id):
+    feed.backfill(follower_id, followee_id)
+
+
+@celery_app.task
+def flush_like_buffer():
+    return like_buffer.flush()
+
+
+@celery_app.task
+def preload_holiday_calendars():
+    year = timezone.localdate().year
+    for country_code in settings.HOLIDAY_PRELOAD_COUNTRIES:
+        holidays.preload(country_code, year)
+
+
+@celery_app.task
+def purge_expired_tokens():
+    """
+    Delete expired tokens, then re-mirror the blacklist into Redis in case
+    an update to it was lost
+    """
+
+    deleted = tokens.purge_expired(settings.TOKEN_PURGE_BATCH_SIZE)
+    tokens.token_blacklist.sync()
+    return deleted
@@ -13,25 +13,64 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+from api.serializers import RefreshSerializer
 from api.views import (
+    FeedView,
+    FollowView,
+    LikesBatchView,
     LikesView,
     LogoutView,
-    PostCreateView,
     PostDetailView,
-    UserCreateView,
+    PostLikesView,
+    PostListView,
     UserDetailView,
+    UserListView,
+    UserPostsView,
 )
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path
-from rest_framework_simplejwt.views import TokenObtainPairView
+from rest_framework_simplejwt.views import (
+    TokenObtainPairView,
+    TokenRefreshView,
+)
+
+if settings.ASYNC_VIEWS:
+    # under ASGI the API is served by native async views, rather than by
+    # sync views all sharing one thread
+    from api.async_views import (
+        FeedView,
+        FollowView,
+        LikesBatchView,
+        LikesView,
+        LogoutView,
+        PostDetailView,
+        PostLikesView,
+        PostListView,
+        TokenObtainPairView,
+        TokenRefreshView,
+        UserDetailView,
+        UserListView,
+        UserPostsView,
+    )
 
 urlpatterns = [
     path("admin/", admin.site.urls),
-    path("user/", UserCreateView.as_view(), name="user-create"),
+    path("user/", UserListView.as_view(), name="user-list"),
     path("user/<int:pk>/", UserDetailView.as_view(), name="user-detail"),
-    path("post/", PostCreateView.as_view(), name="post-create"),
+    path("user/<int:pk>/posts/", UserPostsView.as_view(), name="user-posts"),
+    path("post/", PostListView.as_view(), name="post-list"),
     path("post/<int:pk>/", PostDetailView.as_view(), name="post-detail"),
+    path("post/<int:pk>/likes/", PostLikesView.as_view(), name="post-likes"),
+    path("likes/", LikesBatchView.as_view(), name="likes-batch"),
     path("likes/<int:pk>/", LikesView.as_view(), name="likes"),
+    path("follow/<int:pk>/", FollowView.as_view(), name="follow"),
+    path("feed/", FeedView.as_view(), name="feed"),
     path("login/", TokenObtainPairView.as_view(), name="login"),
+    path(
+        "refresh/",
+        TokenRefreshView.as_view(serializer_class=RefreshSerializer),
+        name="refresh",
+    ),
     path("logout/", LogoutView.as_view(), name="logout"),
 ]
@@ -0,0 +1,36 @@
+# Read by gunicorn from its working directory.
+import os
+
+# Threaded workers, with more threads than the password hashing pool
+# admits hashes (PASSWORD_HASHER_POOL_SIZE + PASSWORD_HASHER_MAX_PENDING),
+# so that a request waiting on its hash holds a thread rather than the
+# whole worker, and hashes past the pool's limit are refused with a 503.
+# The ASGI deployment picks its own worker class on the command line.
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", default=16))
+
+# Port the master serves the Prometheus metrics of all the workers on, away
+# from the public one; 0 to not serve them.
+metrics_port = int(os.environ.get("METRICS_PORT", default=9539))
+
+
+def when_ready(server):
+    if not metrics_port or "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return
+    from prometheus_client import (
+        CollectorRegistry,
+        multiprocess,
+        start_http_server,
+    )
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    start_http_server(metrics_port, registry=registry)
+
+
+def child_exit(server, worker):
+    # drop the live gauges of a worker that is gone from the metrics shared
+    # by all workers
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)